@@ -9,10 +9,13 @@ import atexit
 from apscheduler.schedulers.background import BackgroundScheduler
 from .poller import poll_once
 from .cleaner import clean_old
-from .config import POLL_INTERVAL, reload_config
-from .db import init_db
-from .notifier import send_startup_notification
+from .config import add_config_listener, get_config, reload_config, watcher as config_watcher
+from .db import engine, init_db
+from .metrics import start_metrics_server
+from .notifier import dispatcher, send_startup_notification
+from .scheduler import miner_scheduler
 from .settings_manager import load_settings
+from .sharding import SHARDING_ENABLED, coordinator
 
 logger = logging.getLogger(__name__)
 
@@ -20,8 +23,7 @@ logger = logging.getLogger(__name__)
 scheduler = None
 DATA_DIR = pathlib.Path(os.getenv("DB_DATA_DIR", "/app/data"))
 PID_FILE = DATA_DIR / "sentry.pid"
-DB_PATH = pathlib.Path(os.getenv("DB_PATH", DATA_DIR / "bitaxe_sentry.db"))# Track current poll interval to detect changes
-current_poll_interval = POLL_INTERVAL
+DB_PATH = pathlib.Path(os.getenv("DB_PATH", DATA_DIR / "bitaxe_sentry.db"))
 
 def cleanup():
     """Remove PID file on exit"""
@@ -36,37 +38,31 @@ def handle_sighup(signum, frame):
     """Handle SIGHUP signal to reload configuration"""
     logger.info("Received SIGHUP signal, reloading configuration...")
     
-    # Reload config from file
-    global scheduler, current_poll_interval
+    # Reload config from file; listeners update the scheduler if needed
     reload_config()
-    
-    # Update the scheduler if poll interval changed
-    update_scheduler_if_needed()
 
-def update_scheduler_if_needed():
-    """Update the scheduler if poll interval has changed"""
-    global scheduler, current_poll_interval
-    
-    # Get the current poll interval from config
-    from .config import POLL_INTERVAL
-    
-    # Check if poll interval has changed
-    if current_poll_interval != POLL_INTERVAL:
-        logger.info(f"Poll interval changed from {current_poll_interval} to {POLL_INTERVAL} minutes")
-        
-        if scheduler:
-            try:
-                # Reschedule the polling job with the new interval
-                scheduler.reschedule_job('poller', trigger='interval', minutes=POLL_INTERVAL)
-                logger.info(f"Scheduler updated with new poll interval: {POLL_INTERVAL} minutes")
-                
-                # Update the current poll interval
-                current_poll_interval = POLL_INTERVAL
-            except Exception as e:
-                logger.exception(f"Error updating scheduler: {e}")
-        else:
-            logger.warning("Scheduler not initialized, cannot update")
-            current_poll_interval = POLL_INTERVAL
+def handle_sigterm(signum, frame):
+    """Handle SIGTERM (container stop) like Ctrl+C, so the exit handlers run"""
+    raise KeyboardInterrupt
+
+def local_config(config):
+    """Restrict a configuration snapshot to this worker's miners in sharding mode"""
+    return coordinator.assign(config) if SHARDING_ENABLED else config
+
+def on_config_change(old, new):
+    """Apply a new configuration snapshot to the miner schedule"""
+    miner_scheduler.update(local_config(new))
+
+def on_workers_change(ring):
+    """Reschedule when sentry workers join or leave, so their miners are rebalanced"""
+    miner_scheduler.update(local_config(get_config()))
+
+def run_cleaner():
+    """Clean up old data; with sharding, only one worker does"""
+    if SHARDING_ENABLED and not coordinator.is_leader():
+        logger.info("Skipping cleanup, another worker runs it")
+        return
+    clean_old()
 
 def main():
     """Main entry point for the Bitaxe Sentry application."""
@@ -82,62 +78,68 @@ def main():
     except Exception as e:
         logger.warning(f"Could not save PID to file: {e}")
     
+    # Deliver queued alerts before the process exits
+    atexit.register(dispatcher.flush)
+    
     # Initialize database
     init_db()
     
+    # Expose poll, database and webhook metrics for Prometheus
+    start_metrics_server(engine)
+    
+    # Share the miners with the other live workers
+    if SHARDING_ENABLED:
+        coordinator.add_listener(on_workers_change)
+        coordinator.start()
+        atexit.register(coordinator.stop)
+    
+    # Reschedule when the settings change; the watcher checks the config file
+    add_config_listener(on_config_change)
+    config_watcher.start()
+    
     # Register signal handler for SIGHUP
     signal.signal(signal.SIGHUP, handle_sighup)
     logger.info("Registered SIGHUP handler for configuration reload")
+    signal.signal(signal.SIGTERM, handle_sigterm)
     
-    # Create scheduler
-    global scheduler, current_poll_interval
+    # Create scheduler for maintenance jobs; miners are polled by the miner scheduler
+    global scheduler
     scheduler = BackgroundScheduler()
-    
-    # Add jobs
-    scheduler.add_job(
-        poll_once, 
-        'interval', 
-        minutes=POLL_INTERVAL, 
-        id='poller'
-    )
-    scheduler.add_job(clean_old, 'cron', hour=0, id='cleaner')
+    scheduler.add_job(run_cleaner, 'cron', hour=0, id='cleaner')
     
     # Start the scheduler
     scheduler.start()
-    logger.info(f"Scheduler started. Polling every {POLL_INTERVAL} minutes")
+    logger.info("Scheduler started")
     
-    # Send startup notification to Discord
+    # Send startup notification to Discord; delivery failures are logged by the dispatcher
     notification_status = send_startup_notification()
     if notification_status:
-        logger.info("Discord webhook verified")
+        logger.info("Startup notification queued")
     else:
         logger.warning("Discord notifications may not be working correctly")
     
     try:
         # Run initial poll immediately
         logger.info("Running initial poll now")
-        poll_once()
+        poll_once(endpoints=local_config(get_config()).endpoints)
         logger.info("Initial poll completed")
         
-        # Keep the main thread running
+        # From now on each miner is polled at its own slot of the interval
+        miner_scheduler.start(local_config(get_config()))
+        
+        # Keep the main thread running; config changes are handled by the watcher
         while True:
-            time.sleep(60)  # Check every minute
-            
-            # Check if config has changed
-            try:
-                if reload_config():
-                    # Config has changed, update scheduler if needed
-                    update_scheduler_if_needed()
-            except Exception as e:
-                logger.exception(f"Error checking config: {e}")
+            time.sleep(60)
                 
     except KeyboardInterrupt:
         logger.info("Shutting down Bitaxe Sentry")
+        miner_scheduler.stop()
         scheduler.shutdown()
         cleanup()  # Explicit cleanup
         sys.exit(0)
     except Exception as e:
         logger.exception(f"Fatal error: {e}")
+        miner_scheduler.stop()
         scheduler.shutdown()
         cleanup()  # Explicit cleanup
         sys.exit(1)
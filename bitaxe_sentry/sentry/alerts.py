@@ -0,0 +1,215 @@
+import datetime
+import logging
+
+from sqlmodel import select
+
+from .config import get_config
+from .db import AlertState
+from .metrics import ALERTS
+from .notifier import (
+    send_diff_alert,
+    send_miner_offline_alert,
+    send_resolved_alert,
+    send_temperature_alert,
+    send_voltage_alert,
+)
+
+logger = logging.getLogger(__name__)
+
+OK = "ok"
+FIRING = "firing"
+
+
+def temperature_condition(temperature, temp_min, temp_max, hysteresis):
+    """
+    Evaluate the temperature range with a hysteresis band.
+
+    Returns:
+        True if out of range, False if back inside the range by at least the
+        hysteresis margin, None while in between (the state is kept).
+        The margin is limited to half the range, so a narrow range still
+        has readings that resolve the alert.
+    """
+    if temperature > temp_max or temperature < temp_min:
+        return True
+    hysteresis = min(hysteresis, max(0.0, (temp_max - temp_min) / 2))
+    if temp_min + hysteresis <= temperature <= temp_max - hysteresis:
+        return False
+    return None
+
+
+def voltage_condition(voltage, volt_min, hysteresis):
+    """
+    Evaluate the minimum voltage with a hysteresis band.
+
+    Returns:
+        True if below the minimum, False if above it by at least the
+        hysteresis margin, None while in between (the state is kept)
+    """
+    if voltage < volt_min:
+        return True
+    if voltage >= volt_min + hysteresis:
+        return False
+    return None
+
+
+class AlertEngine:
+    """
+    Track alert conditions per miner across polling cycles.
+
+    Every (miner, condition) pair is either ok or firing. A notification is
+    sent when a condition starts firing and repeated at most once per cool-down
+    while it keeps firing; a resolved notification follows when it clears.
+    Hysteresis keeps values hovering around a threshold from flapping.
+
+    State changes are made in the caller's session so they are committed with
+    the readings of the cycle, and a restart does not fire active alerts again.
+    Notifications are collected and only sent by notify(), after the commit.
+    """
+
+    def __init__(self, session, now=None, miner_ids=None):
+        """
+        Args:
+            session: Open database session of the polling cycle
+            now: Time of the polling cycle
+            miner_ids: Only load the alert states of these miners
+        """
+        config = get_config()
+        self.session = session
+        self.now = now or datetime.datetime.utcnow()
+        self.cooldown = datetime.timedelta(minutes=config.alert_cooldown_minutes)
+        self.temp_min = config.temp_min
+        self.temp_max = config.temp_max
+        self.temp_hysteresis = config.temp_hysteresis
+        self.volt_min = config.volt_min
+        self.volt_hysteresis = config.volt_hysteresis
+
+        query = select(AlertState)
+        if miner_ids is not None:
+            query = query.where(AlertState.miner_id.in_(miner_ids))
+        self.states = {(state.miner_id, state.condition): state for state in session.exec(query).all()}
+        self._notifications = []
+        # Miners that are offline or outside or near a threshold in this cycle
+        self.suspect = set()
+
+    def _cooled_down(self, state):
+        return state.last_notified_at is None or self.now - state.last_notified_at >= self.cooldown
+
+    def _transition(self, miner, condition, active, value):
+        """
+        Apply one observation of a condition.
+
+        Returns:
+            tuple: ("fired" | "resolved", episode start) if a notification is
+                   due, otherwise None
+        """
+        if active is None:
+            return None
+
+        key = (miner.id, condition)
+        state = self.states.get(key)
+        if state is None:
+            if not active:
+                # Healthy conditions get a row once they first fire
+                return None
+            state = AlertState(miner_id=miner.id, condition=condition, state=OK, since=self.now)
+            self.states[key] = state
+            self.session.add(state)
+
+        if active:
+            if state.state != FIRING:
+                logger.warning(f"{condition.capitalize()} alert firing for {miner.name} (value: {value})")
+                state.state = FIRING
+                state.since = self.now
+                state.notified = False
+            state.value = value
+
+            if not self._cooled_down(state):
+                logger.debug(f"{condition.capitalize()} alert for {miner.name} within cool-down, not sent")
+                return None
+            state.notified = True
+            state.last_notified_at = self.now
+            return "fired", state.since
+
+        if state.state != FIRING:
+            return None
+
+        # Only announce the recovery of an alert that was announced
+        started, notified = state.since, state.notified
+        logger.info(f"{condition.capitalize()} alert resolved for {miner.name} (value: {value})")
+        state.state = OK
+        state.since = self.now
+        state.value = value
+        state.notified = False
+        return ("resolved", started) if notified else None
+
+    def observe_reading(self, miner, reading, prev_best_diff):
+        """
+        Evaluate a successful reading of a miner.
+
+        Args:
+            miner: The miner instance
+            reading: Polled reading with its values as attributes
+            prev_best_diff: best_diff of the miner's previous reading, or None
+        """
+        checks = (
+            ("temperature", reading.temperature, send_temperature_alert,
+             temperature_condition(reading.temperature, self.temp_min, self.temp_max, self.temp_hysteresis)),
+            ("voltage", reading.voltage, send_voltage_alert,
+             voltage_condition(reading.voltage, self.volt_min, self.volt_hysteresis)),
+            # A successful reading clears an offline alert
+            ("offline", None, None, False),
+        )
+        for condition, value, send, active in checks:
+            # Out of range or still inside the hysteresis band
+            if active is not False:
+                self.suspect.add(miner.id)
+            event = self._transition(miner, condition, active, value)
+            if event is None:
+                continue
+            kind, started = event
+            if kind == "fired":
+                ALERTS.labels(condition).inc()
+                self._notifications.append((send, (miner, reading)))
+            else:
+                ALERTS.labels("resolved").inc()
+                self._notifications.append((send_resolved_alert, (miner, condition, value, started)))
+
+        # New best diff is an event rather than a condition
+        if prev_best_diff is not None and reading.best_diff != prev_best_diff:
+            logger.info(f"New best diff for {miner.name}: {reading.best_diff}")
+            ALERTS.labels("diff").inc()
+            self._notifications.append((send_diff_alert, (miner, reading)))
+
+    def observe_offline(self, miner, last_seen=None):
+        """
+        Record that a miner failed to respond.
+
+        Args:
+            miner: The miner instance
+            last_seen: Timestamp of the miner's latest reading, if known
+        """
+        self.suspect.add(miner.id)
+        if self._transition(miner, "offline", True, None) is not None:
+            ALERTS.labels("offline").inc()
+            self._notifications.append((send_miner_offline_alert, (miner, last_seen)))
+
+    def notify(self, aggregator=None):
+        """
+        Send the notifications collected during the cycle.
+
+        Args:
+            aggregator: AlertAggregator collecting the alerts of the cycle
+
+        Returns:
+            int: Number of notifications sent or added to the aggregator
+        """
+        sent = 0
+        for send, args in self._notifications:
+            try:
+                if send(*args, aggregator=aggregator):
+                    sent += 1
+            except Exception as e:
+                logger.exception(f"Failed to send {send.__name__} for {args[0].name}: {e}")
+        self._notifications = []
+        return sent
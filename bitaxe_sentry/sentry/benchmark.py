@@ -0,0 +1,255 @@
+import argparse
+import gc
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+from .simulator import MINER_PATH, SimulatorServer, add_fleet_arguments, fleet_from_args
+
+logger = logging.getLogger(__name__)
+
+FLEET_SIZES = (10, 100, 1000, 5000)
+
+# Name of the DB commit time histogram, see metrics.DB_COMMIT_SECONDS
+DB_COMMIT_SUM = "bitaxe_sentry_db_commit_seconds_sum"
+
+
+def current_rss_mb():
+    """Resident memory of this process in MB."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb():
+    """Highest resident memory of this process so far in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and in kilobytes elsewhere
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+def _serve_fleet(miners, args, urls):
+    """Run the simulated fleet in a child process until it is terminated."""
+    server = SimulatorServer(fleet_from_args(miners, args))
+    urls.put(server.start())
+    while True:
+        time.sleep(60)
+
+
+def start_simulator(miners, args):
+    """
+    Serve the simulated fleet from a separate process, so it does not compete
+    with the poller for the GIL and its memory is not counted.
+
+    Returns:
+        tuple: (process, base URL)
+    """
+    context = multiprocessing.get_context("spawn")
+    urls = context.Queue()
+    process = context.Process(target=_serve_fleet, args=(miners, args, urls), daemon=True)
+    process.start()
+    return process, urls.get(timeout=60)
+
+
+def benchmark_fleet(base_url, miners, cycles):
+    """
+    Poll a fleet of simulated miners through poller.poll_endpoints().
+
+    One warm-up cycle creates the miners and their state rows and is not
+    counted, so the measured cycles show the steady state.
+
+    Returns:
+        dict: Timings and memory use of the measured cycles
+    """
+    from prometheus_client import REGISTRY
+
+    from .health import endpoint_health
+    from .poller import OFFLINE, poll_endpoints
+
+    endpoints = [base_url + MINER_PATH.format(index=index) for index in range(miners)]
+    # Each fleet size starts with all circuits closed
+    endpoint_health.retain(())
+    poll_endpoints(endpoints)
+    gc.collect()
+    rss_before = current_rss_mb()
+
+    cycle_seconds, db_seconds, offline = [], [], []
+    for _ in range(cycles):
+        db_before = REGISTRY.get_sample_value(DB_COMMIT_SUM) or 0.0
+        start = time.perf_counter()
+        statuses = poll_endpoints(endpoints)
+        cycle_seconds.append(time.perf_counter() - start)
+        db_seconds.append((REGISTRY.get_sample_value(DB_COMMIT_SUM) or 0.0) - db_before)
+        offline.append(sum(1 for status in statuses.values() if status == OFFLINE))
+
+    cycle_p50 = statistics.median(cycle_seconds)
+    rss_after = current_rss_mb()
+    return {
+        "miners": miners,
+        "cycles": cycles,
+        "cycle_seconds_p50": round(cycle_p50, 4),
+        "cycle_seconds_max": round(max(cycle_seconds), 4),
+        "miners_per_second": round(miners / cycle_p50, 1),
+        "db_write_ms_p50": round(statistics.median(db_seconds) * 1000, 2),
+        "offline_per_cycle": round(statistics.mean(offline), 1),
+        "rss_mb": round(rss_after, 1),
+        "rss_growth_mb": round(rss_after - rss_before, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+# Columns of the results table: (result key, title, format)
+RESULT_COLUMNS = (
+    ("miners", "miners", "{}"),
+    ("cycle_seconds_p50", "cycle p50 (s)", "{:.3f}"),
+    ("cycle_seconds_max", "cycle max (s)", "{:.3f}"),
+    ("miners_per_second", "miners/s", "{:.1f}"),
+    ("db_write_ms_p50", "db write (ms)", "{:.2f}"),
+    ("offline_per_cycle", "offline", "{:.1f}"),
+    ("rss_mb", "rss (MB)", "{:.1f}"),
+    ("rss_growth_mb", "rss growth (MB)", "{:.1f}"),
+)
+
+# Result values compared with the baseline; higher is worse
+COMPARED_RESULTS = ("cycle_seconds_p50", "db_write_ms_p50")
+
+
+def print_results(results, columns=RESULT_COLUMNS):
+    """Print benchmark results as a table, one row per result."""
+    rows = [[fmt.format(result[key]) for key, _, fmt in columns] for result in results]
+    widths = [max([15, len(title)] + [len(row[i]) for row in rows]) for i, (_, title, _) in enumerate(columns)]
+    print("  ".join(f"{title:>{width}}" for (_, title, _), width in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(f"{value:>{width}}" for value, width in zip(row, widths)))
+
+
+def compare_with_baseline(results, baseline, tolerance, key="miners", compared=COMPARED_RESULTS):
+    """
+    Compare results with those of an earlier run.
+
+    Args:
+        results: Results of this run
+        baseline: Report of the earlier run as written with --output
+        tolerance: Allowed relative increase of a value
+        key: Result field identifying the same measurement in both runs
+        compared: Result fields to compare; higher values are worse
+
+    Returns:
+        list: Descriptions of the values that got worse by more than `tolerance`
+    """
+    previous = {result[key]: result for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        before = previous.get(result[key])
+        if before is None:
+            continue
+        for field in compared:
+            if before[field] and result[field] > before[field] * (1 + tolerance):
+                regressions.append(f"{result[key]}: {field} {before[field]} -> {result[field]} "
+                                   f"(+{result[field] / before[field] - 1:.0%})")
+    return regressions
+
+
+def check_baseline(report, path, tolerance, key="miners", compared=COMPARED_RESULTS):
+    """
+    Compare a report with the baseline report stored at `path` and print regressions.
+
+    Returns:
+        int: Exit status, 1 if anything got worse by more than `tolerance`
+    """
+    with open(path) as f:
+        baseline = json.load(f)
+    if baseline.get("options") != report["options"]:
+        print("Warning: the baseline was recorded with different benchmark options", file=sys.stderr)
+    regressions = compare_with_baseline(report["results"], baseline, tolerance, key, compared)
+    for regression in regressions:
+        print(f"Regression: {regression}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+def use_scratch_data_dir(data_dir, db_path=None, db_url=None):
+    """
+    Point the settings and the database at a scratch directory.
+
+    Both are set up when the sentry modules are first imported, so this must
+    run before anything imports settings_manager, config or db.
+    """
+    os.environ["DB_DATA_DIR"] = data_dir
+    os.environ["DB_PATH"] = db_path or os.path.join(data_dir, "benchmark.db")
+    if db_url:
+        os.environ["DB_URL"] = db_url
+    else:
+        os.environ.pop("DB_URL", None)
+
+
+def main(argv=None):
+    """Benchmark polling cycles against simulated fleets of increasing size."""
+    parser = argparse.ArgumentParser(description="Benchmark Bitaxe Sentry polling against a simulated fleet")
+    parser.add_argument("--sizes", default=",".join(map(str, FLEET_SIZES)),
+                        help="Comma-separated fleet sizes to benchmark")
+    parser.add_argument("--cycles", type=int, default=3, help="Measured polling cycles per fleet size")
+    parser.add_argument("--concurrency", type=int, default=None, help="Miners polled at the same time (default: setting)")
+    parser.add_argument("--request-timeout", type=float, default=None, help="Miner request timeout in seconds")
+    parser.add_argument("--db-url", help="Benchmark against this database instead of a temporary SQLite file")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed slowdown compared with the baseline before the run fails")
+    parser.add_argument("--log-level", default="CRITICAL",
+                        help="Log level during the run; simulated failures are logged as errors")
+    add_fleet_arguments(parser)
+    args = parser.parse_args(argv)
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+
+    logging.getLogger().setLevel(args.log_level.upper())
+
+    with tempfile.TemporaryDirectory(prefix="bitaxe-benchmark-") as data_dir:
+        use_scratch_data_dir(data_dir, db_url=args.db_url)
+
+        from .settings_manager import DEFAULT_SETTINGS, save_settings
+        settings = dict(DEFAULT_SETTINGS)
+        if args.concurrency:
+            settings["POLL_CONCURRENCY"] = args.concurrency
+        save_settings(settings)
+
+        import httpx
+
+        from . import poller
+        from .db import init_db
+        if args.request_timeout:
+            poller.REQUEST_TIMEOUT = httpx.Timeout(args.request_timeout, connect=poller.CONNECT_TIMEOUT)
+        init_db()
+
+        process, base_url = start_simulator(max(sizes), args)
+        try:
+            results = []
+            for size in sizes:
+                print(f"Polling {size} simulated miners...", file=sys.stderr, flush=True)
+                results.append(benchmark_fleet(base_url, size, args.cycles))
+        finally:
+            process.terminate()
+
+    print_results(results)
+    report = {
+        "options": {key: value for key, value in vars(args).items()
+                    if key not in ("sizes", "output", "baseline", "tolerance", "log_level", "db_url")},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        return check_baseline(report, args.baseline, args.tolerance)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
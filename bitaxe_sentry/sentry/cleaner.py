@@ -1,24 +1,156 @@
 import datetime
 import logging
-from sqlmodel import Session, delete
-from .config import RETENTION_DAYS
+import time
+from sqlmodel import Session, delete, select
+from .config import get_config
 from .db import engine, Reading
+from .lease import delete_stale_leases
+from .rollup import prune_rollups
 
 logger = logging.getLogger(__name__)
 
+# Rows deleted per transaction; each batch holds the write lock only briefly
+DELETE_BATCH_SIZE = 5000
+
+# Seconds to pause between batches so the poller and web app can get the lock
+BATCH_PAUSE = 0.05
+
+# Seconds between progress log lines
+PROGRESS_INTERVAL = 10
+
+# Free pages returned to the filesystem per incremental vacuum step (SQLite)
+VACUUM_PAGES_PER_STEP = 2000
+
+
+def delete_old_readings(cutoff):
+    """
+    Delete readings older than cutoff in bounded batches.
+
+    Each batch selects the oldest reading IDs and deletes them in its own
+    short transaction, pausing between batches.
+
+    Returns:
+        int: Number of readings deleted
+    """
+    deleted = 0
+    start = last_report = time.perf_counter()
+
+    while True:
+        with Session(engine) as session:
+            ids = session.exec(
+                select(Reading.id)
+                .where(Reading.timestamp < cutoff)
+                .order_by(Reading.timestamp)
+                .limit(DELETE_BATCH_SIZE)
+            ).all()
+            if not ids:
+                break
+            session.exec(delete(Reading).where(Reading.id.in_(ids)))
+            session.commit()
+
+        deleted += len(ids)
+        now = time.perf_counter()
+        if now - last_report >= PROGRESS_INTERVAL:
+            logger.info(f"Cleanup progress: {deleted} readings deleted ({deleted / (now - start):.0f} rows/s)")
+            last_report = now
+
+        if len(ids) < DELETE_BATCH_SIZE:
+            break
+        time.sleep(BATCH_PAUSE)
+
+    elapsed = time.perf_counter() - start
+    rate = deleted / elapsed if elapsed > 0 else 0
+    logger.info(f"Deleted {deleted} readings in {elapsed:.1f}s ({rate:.0f} rows/s)")
+    return deleted
+
+
+def delete_expired_rollups():
+    """
+    Delete expired rollups in bounded batches.
+
+    Returns:
+        int: Number of rollup rows deleted
+    """
+    deleted = 0
+    while True:
+        with Session(engine) as session:
+            count = prune_rollups(session, limit=DELETE_BATCH_SIZE)
+            session.commit()
+        deleted += count
+        if count == 0:
+            break
+        time.sleep(BATCH_PAUSE)
+    return deleted
+
+
+def reclaim_space(db_engine=engine):
+    """
+    Return space freed by the cleanup to the filesystem.
+
+    SQLite databases use incremental auto-vacuum (see migrations), so free
+    pages are released in small steps. PostgreSQL tables are vacuumed outside
+    a transaction; other backends manage free space themselves.
+
+    Args:
+        db_engine: Engine of the database to reclaim space from
+    """
+    dialect = db_engine.dialect.name
+
+    if dialect == "sqlite":
+        with db_engine.connect() as conn:
+            if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() != 2:
+                logger.info("SQLite incremental auto-vacuum is not enabled, skipping space reclaim")
+                return
+            free_pages = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+            page_size = conn.exec_driver_sql("PRAGMA page_size").scalar()
+
+        start = time.perf_counter()
+        remaining = free_pages
+        while remaining > 0:
+            # The sqlite3 module only steps a pragma once on execute(); executescript()
+            # runs it to completion so a whole batch of pages is released
+            raw = db_engine.raw_connection()
+            try:
+                raw.driver_connection.executescript(f"PRAGMA incremental_vacuum({VACUUM_PAGES_PER_STEP});")
+                previous, remaining = remaining, raw.driver_connection.execute("PRAGMA freelist_count").fetchone()[0]
+            finally:
+                raw.close()
+            if remaining >= previous:
+                break
+            time.sleep(BATCH_PAUSE)
+        logger.info(f"Reclaimed {(free_pages - remaining) * page_size / 1024 / 1024:.1f} MB "
+                    f"in {time.perf_counter() - start:.1f}s")
+
+    elif dialect == "postgresql":
+        with db_engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            for table in ("reading", "reading_rollup"):
+                conn.exec_driver_sql(f"VACUUM ANALYZE {table}")
+        logger.info("Vacuumed reading tables")
+
+
 def clean_old():
     """Delete readings older than the retention period."""
-    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=RETENTION_DAYS)
-    
-    with Session(engine) as session:
-        # Count records to be deleted
-        stmt = delete(Reading).where(Reading.timestamp < cutoff)
-        result = session.exec(stmt)
-        deleted_count = result.rowcount
-        
-        # Commit the transaction
-        session.commit()
-        
-        logger.info(f"Cleaned {deleted_count} readings older than {RETENTION_DAYS} days")
-        
-    return deleted_count 
\ No newline at end of file
+    retention_days = get_config().retention_days
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=retention_days)
+
+    deleted_count = delete_old_readings(cutoff)
+    logger.info(f"Cleaned {deleted_count} readings older than {retention_days} days")
+
+    # Rollups have their own, longer retention per resolution
+    pruned_rollups = delete_expired_rollups()
+    logger.info(f"Pruned {pruned_rollups} expired rollup rows")
+
+    # Leases of removed miners would otherwise stay in poll_lease forever
+    try:
+        stale_leases = delete_stale_leases(get_config().endpoints)
+        logger.info(f"Deleted {stale_leases} stale poll leases")
+    except Exception as e:
+        logger.exception(f"Error deleting stale poll leases: {e}")
+
+    if deleted_count or pruned_rollups:
+        try:
+            reclaim_space()
+        except Exception as e:
+            logger.exception(f"Error reclaiming database space: {e}")
+
+    return deleted_count
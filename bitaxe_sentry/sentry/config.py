@@ -1,103 +1,215 @@
+import dataclasses
 import logging
 import os
+import threading
 
 from .settings_manager import load_settings
 
 logger = logging.getLogger(__name__)
 
-# Load settings from JSON config file
-settings = load_settings()
+# Seconds between checks of the config file by the watcher thread
+CONFIG_CHECK_INTERVAL = 5
 
-# Configuration parameters with default values
-POLL_INTERVAL = settings["POLL_INTERVAL_MINUTES"]
-logger.info(f"Configured polling interval: {POLL_INTERVAL} minutes")
 
-RETENTION_DAYS = settings["RETENTION_DAYS"]
-TEMP_MIN = settings["TEMP_MIN"]
-TEMP_MAX = settings["TEMP_MAX"]
-VOLT_MIN = settings["VOLT_MIN"]
+@dataclasses.dataclass(frozen=True)
+class ConfigSnapshot:
+    """
+    Immutable view of the settings at one point in time.
 
-# Process endpoints
-ENDPOINTS = []
-for ep in settings["BITAXE_ENDPOINTS"]:
-    ep = ep.strip()
-    if ep:
-        # Ensure each endpoint has a protocol
-        if not ep.startswith(("http://", "https://")):
-            ep = f"http://{ep}"
-        ENDPOINTS.append(ep)
+    A new snapshot with a higher version replaces the current one whenever the
+    config file changes, so readers always see one consistent set of values.
+    """
+    version: int
+    poll_interval: int  # Minutes between polling cycles
+    # Seconds between polls of a healthy miner; POLL_INTERVAL_SECONDS overrides the minutes
+    poll_interval_seconds: int
+    # Seconds between polls of a miner that is offline or near or past a threshold
+    suspect_poll_seconds: int
+    poll_jitter: float  # Random spread of each poll as a fraction of the interval
+    poll_concurrency: int  # Maximum number of miners polled at the same time
+    retention_days: int
+    temp_min: float
+    temp_max: float
+    volt_min: float
+    # An alert resolves only once the value is back inside the range by this margin
+    temp_hysteresis: float
+    volt_hysteresis: float
+    # Minimum time between notifications for the same miner and condition
+    alert_cooldown_minutes: int
+    endpoints: tuple
+    discord_webhook: str
 
-logger.info(f"Configured endpoints: {ENDPOINTS}")
 
-# Discord webhook
-DISCORD_WEBHOOK = settings["DISCORD_WEBHOOK_URL"]
-if DISCORD_WEBHOOK:
-    logger.info(f"Discord webhook configured: {DISCORD_WEBHOOK[:20]}...")
-else:
-    logger.info("Discord webhook not configured")
+def normalize_endpoints(endpoints):
+    """Strip endpoints and ensure each one has a protocol."""
+    normalized = []
+    for ep in endpoints:
+        ep = ep.strip()
+        if ep:
+            if not ep.startswith(("http://", "https://")):
+                ep = f"http://{ep}"
+            normalized.append(ep)
+    return tuple(normalized)
+
+
+def build_snapshot(settings, version):
+    """Create a ConfigSnapshot from a settings dict as returned by load_settings()."""
+    return ConfigSnapshot(
+        version=version,
+        poll_interval=settings["POLL_INTERVAL_MINUTES"],
+        poll_interval_seconds=max(1, settings["POLL_INTERVAL_SECONDS"] or settings["POLL_INTERVAL_MINUTES"] * 60),
+        suspect_poll_seconds=max(1, settings["SUSPECT_POLL_SECONDS"]),
+        # Capped so consecutive polls of a miner stay at least half an interval apart
+        poll_jitter=min(max(settings["POLL_JITTER_PERCENT"], 0), 25) / 100,
+        poll_concurrency=max(1, settings["POLL_CONCURRENCY"]),
+        retention_days=settings["RETENTION_DAYS"],
+        temp_min=settings["TEMP_MIN"],
+        temp_max=settings["TEMP_MAX"],
+        volt_min=settings["VOLT_MIN"],
+        temp_hysteresis=settings["TEMP_HYSTERESIS"],
+        volt_hysteresis=settings["VOLT_HYSTERESIS"],
+        alert_cooldown_minutes=settings["ALERT_COOLDOWN_MINUTES"],
+        endpoints=normalize_endpoints(settings["BITAXE_ENDPOINTS"]),
+        discord_webhook=settings["DISCORD_WEBHOOK_URL"],
+    )
 
-# Track when config was last modified
 
 def get_config_mtime():
     """Get the modification time of the config file"""
     from .settings_manager import CONFIG_FILE_PATH
     try:
         if os.path.exists(CONFIG_FILE_PATH):
-            return os.path.getmtime(CONFIG_FILE_PATH)
+            return os.stat(CONFIG_FILE_PATH).st_mtime_ns
         return 0
     except Exception:
         return 0
 
-# Initialize last modified time
-last_modified_time = get_config_mtime()
 
-def reload_config():
-    """Reload configuration from JSON config file if it has been modified"""
-    global POLL_INTERVAL, RETENTION_DAYS, TEMP_MIN, TEMP_MAX, VOLT_MIN, ENDPOINTS, DISCORD_WEBHOOK, last_modified_time
-    
-    # Check if the config file has been modified
-    current_mtime = get_config_mtime()
-    if current_mtime <= last_modified_time:
-        # File hasn't been modified, no need to reload
-        return False
-    
-    logger.info("Reloading configuration...")
-    
-    # Load settings from file
-    settings = load_settings()
-    
-    # Now update global variables from settings
-    POLL_INTERVAL = settings["POLL_INTERVAL_MINUTES"]
-    RETENTION_DAYS = settings["RETENTION_DAYS"]
-    TEMP_MIN = settings["TEMP_MIN"]
-    TEMP_MAX = settings["TEMP_MAX"]
-    VOLT_MIN = settings["VOLT_MIN"]
-    DISCORD_WEBHOOK = settings["DISCORD_WEBHOOK_URL"]
-    
-    # Process endpoints
-    ENDPOINTS.clear()
-    for ep in settings["BITAXE_ENDPOINTS"]:
-        ep = ep.strip()
-        if ep:
-            # Ensure each endpoint has a protocol
-            if not ep.startswith(("http://", "https://")):
-                ep = f"http://{ep}"
-            ENDPOINTS.append(ep)
-    
-    # Update the last modified time
-    last_modified_time = current_mtime
-    
-    logger.info("Updated configuration:")
-    logger.info(f"- Poll interval: {POLL_INTERVAL} minutes")
-    logger.info(f"- Retention days: {RETENTION_DAYS}")
-    logger.info(f"- Temperature range: {TEMP_MIN}°C - {TEMP_MAX}°C")
-    logger.info(f"- Minimum voltage: {VOLT_MIN}V")
-    logger.info(f"- Endpoints: {ENDPOINTS}")
-    
-    # Log Discord webhook status
-    if DISCORD_WEBHOOK:
-        logger.info(f"- Discord webhook updated: {DISCORD_WEBHOOK[:20]}...")
+def log_config(config):
+    """Log the values of a snapshot."""
+    logger.info(f"Configuration version {config.version}:")
+    logger.info(f"- Poll interval: {config.poll_interval_seconds}s, suspect miners: {config.suspect_poll_seconds}s, "
+                f"jitter: {config.poll_jitter:.0%}")
+    logger.info(f"- Poll concurrency: {config.poll_concurrency}")
+    logger.info(f"- Retention days: {config.retention_days}")
+    logger.info(f"- Temperature range: {config.temp_min}°C - {config.temp_max}°C")
+    logger.info(f"- Minimum voltage: {config.volt_min}V")
+    logger.info(f"- Alert hysteresis: {config.temp_hysteresis}°C / {config.volt_hysteresis}V, "
+                f"cool-down: {config.alert_cooldown_minutes} minutes")
+    logger.info(f"- Endpoints: {list(config.endpoints)}")
+    if config.discord_webhook:
+        logger.info(f"- Discord webhook configured: {config.discord_webhook[:20]}...")
     else:
         logger.info("- Discord webhook not configured")
-    
-    return True 
\ No newline at end of file
+
+
+# The current snapshot. It is only ever replaced, never modified, so callers
+# can read it without locking.
+_config = build_snapshot(load_settings(), 1)
+log_config(_config)
+
+# Modification time of the config file the current snapshot was loaded from
+last_modified_time = get_config_mtime()
+
+_reload_lock = threading.Lock()
+_listeners = []
+
+
+def get_config():
+    """
+    Return the current configuration snapshot.
+
+    This does no I/O; the snapshot is refreshed by the config watcher and by
+    reload_config().
+
+    Returns:
+        ConfigSnapshot: The current settings
+    """
+    return _config
+
+
+def add_config_listener(callback):
+    """Call callback(old, new) with both snapshots whenever the configuration changes."""
+    _listeners.append(callback)
+
+
+def reload_config():
+    """
+    Reload configuration from JSON config file if it has been modified.
+
+    Returns:
+        bool: True if a new snapshot was loaded
+    """
+    global _config, last_modified_time
+
+    with _reload_lock:
+        # Check if the config file has been modified
+        current_mtime = get_config_mtime()
+        if current_mtime == last_modified_time:
+            return False
+
+        logger.info("Reloading configuration...")
+        old = _config
+        _config = build_snapshot(load_settings(), old.version + 1)
+        last_modified_time = current_mtime
+        log_config(_config)
+
+    for callback in list(_listeners):
+        try:
+            callback(old, _config)
+        except Exception as e:
+            logger.exception(f"Error in config listener: {e}")
+    return True
+
+
+class ConfigWatcher:
+    """Check the config file periodically from a background thread."""
+
+    def __init__(self, interval=CONFIG_CHECK_INTERVAL):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="config-watcher", daemon=True)
+            self._thread.start()
+            logger.info(f"Watching config file for changes every {self.interval}s")
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                reload_config()
+            except Exception as e:
+                logger.exception(f"Error reloading configuration: {e}")
+
+
+watcher = ConfigWatcher()
+
+
+# Settings used to be module constants; keep `config.POLL_INTERVAL` and friends
+# working as read-only views of the current snapshot.
+_LEGACY_NAMES = {
+    "POLL_INTERVAL": "poll_interval",
+    "POLL_INTERVAL_SECONDS": "poll_interval_seconds",
+    "POLL_CONCURRENCY": "poll_concurrency",
+    "RETENTION_DAYS": "retention_days",
+    "TEMP_MIN": "temp_min",
+    "TEMP_MAX": "temp_max",
+    "VOLT_MIN": "volt_min",
+    "TEMP_HYSTERESIS": "temp_hysteresis",
+    "VOLT_HYSTERESIS": "volt_hysteresis",
+    "ALERT_COOLDOWN_MINUTES": "alert_cooldown_minutes",
+    "ENDPOINTS": "endpoints",
+    "DISCORD_WEBHOOK": "discord_webhook",
+}
+
+
+def __getattr__(name):
+    if name in _LEGACY_NAMES:
+        return getattr(_config, _LEGACY_NAMES[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,182 @@
+import argparse
+import datetime
+import logging
+import sys
+import time
+
+import numpy as np
+from sqlalchemy import func, insert
+from sqlmodel import Session, select
+
+from .db import BestDiffEvent, Miner, MinerState, Reading, StratumEndpoint, engine, init_db
+from .rollup import backfill_rollups, prune_rollups
+from .simulator import format_difficulty
+
+logger = logging.getLogger(__name__)
+
+# Readings per INSERT batch
+INSERT_CHUNK_SIZE = 20000
+
+POOL_URLS = (
+    "stratum+tcp://bc1qsynthetic@public-pool.io:21496",
+    "stratum+tcp://bc1qsynthetic@solo.ckpool.org:3333",
+)
+
+
+def _miner_series(rng, count, interval):
+    """
+    Plausible telemetry of one miner as arrays of `count` readings.
+
+    Returns:
+        dict: Column name -> numpy array
+    """
+    t = np.arange(count) * interval
+    day = 2 * np.pi * t / 86400
+    base_hash_rate = rng.uniform(400, 1200)
+    base_temp = rng.uniform(45, 60)
+
+    # Best difficulty rises a few times over the whole range
+    best_diff = np.full(count, rng.uniform(1e6, 1e8))
+    for start in np.sort(rng.integers(0, count, size=max(1, count // 5000))):
+        best_diff[start:] *= rng.uniform(1.1, 5)
+
+    return {
+        "hash_rate": base_hash_rate * (1 + 0.03 * np.sin(day) + rng.normal(0, 0.02, count)),
+        "temperature": base_temp + 3 * np.sin(day + 1) + rng.normal(0, 0.5, count),
+        "voltage": rng.uniform(5.0, 5.2) + rng.normal(0, 0.01, count),
+        "best_diff": best_diff,
+        "sharesAccepted": np.cumsum(rng.integers(0, 20, count)),
+        "sharesRejected": np.cumsum(rng.random(count) < 0.01),
+        # Some miners switch to the fallback pool for a while
+        "stratum_index": (rng.random() < 0.1) & (np.sin(day / 7) > 0.9),
+    }
+
+
+def generate_fleet(miners, days, interval, end=None, seed=0, db_engine=engine):
+    """
+    Fill an empty database with `miners` miners reporting every `interval`
+    seconds for `days` days, including miner state, best diff events and
+    rollups, as if the sentry had polled them all along.
+
+    Args:
+        miners: Number of miners
+        days: Days of history per miner
+        interval: Seconds between readings of a miner
+        end: Time of the newest readings, now if None
+        seed: Seed of the random values
+        db_engine: Engine of the database to fill
+
+    Returns:
+        int: Number of readings written
+    """
+    end = end or datetime.datetime.utcnow()
+    count = int(days * 86400 // interval)
+    start = end - datetime.timedelta(seconds=(count - 1) * interval)
+    rng = np.random.default_rng(seed)
+    written = 0
+    begin = time.perf_counter()
+
+    with Session(db_engine) as session:
+        if session.exec(select(func.count()).select_from(Miner)).one():
+            raise ValueError("The database already contains miners")
+
+        pools = [StratumEndpoint(url=url) for url in POOL_URLS]
+        session.add_all(pools)
+        session.flush()
+        pool_ids = np.array([pool.id for pool in pools])
+
+        for index in range(miners):
+            miner = Miner(name=f"bitaxe-{index}", endpoint=f"http://10.{index // 62500}.{index // 250 % 250}.{index % 250 + 1}",
+                          added_at=start)
+            session.add(miner)
+            session.flush()
+
+            series = _miner_series(rng, count, interval)
+            # Miners are polled at different offsets within the interval
+            offset = datetime.timedelta(seconds=float(rng.uniform(0, interval)))
+            timestamps = (np.datetime64(start - offset, "us")
+                          + (np.arange(count) * interval * 1_000_000).astype("timedelta64[us]")).astype(datetime.datetime)
+            stratum_ids = pool_ids[series["stratum_index"].astype(int)]
+
+            for chunk_start in range(0, count, INSERT_CHUNK_SIZE):
+                chunk = slice(chunk_start, chunk_start + INSERT_CHUNK_SIZE)
+                session.connection().execute(insert(Reading), [
+                    {
+                        "miner_id": miner.id,
+                        "timestamp": timestamp,
+                        "hash_rate": hash_rate,
+                        "temperature": temperature,
+                        "best_diff": best_diff,
+                        "voltage": voltage,
+                        "stratumDiff": 1000,
+                        "sharesAccepted": accepted,
+                        "sharesRejected": rejected,
+                        "stratum_id": stratum_id,
+                    }
+                    for timestamp, hash_rate, temperature, best_diff, voltage, accepted, rejected, stratum_id in zip(
+                        timestamps[chunk],
+                        series["hash_rate"][chunk].tolist(),
+                        series["temperature"][chunk].tolist(),
+                        series["best_diff"][chunk].tolist(),
+                        series["voltage"][chunk].tolist(),
+                        series["sharesAccepted"][chunk].tolist(),
+                        series["sharesRejected"][chunk].tolist(),
+                        stratum_ids[chunk].tolist(),
+                    )
+                ])
+            written += count
+
+            changes = np.flatnonzero(np.diff(series["best_diff"], prepend=0))
+            session.connection().execute(insert(BestDiffEvent), [
+                {
+                    "miner_id": miner.id,
+                    "timestamp": timestamps[i],
+                    "best_diff": format_difficulty(series["best_diff"][i]),
+                    "value": float(series["best_diff"][i]),
+                }
+                for i in changes
+            ])
+            session.add(MinerState(
+                miner_id=miner.id,
+                last_seen=timestamps[-1],
+                hash_rate=float(series["hash_rate"][-1]),
+                temperature=float(series["temperature"][-1]),
+                best_diff=format_difficulty(series["best_diff"][-1]),
+                voltage=float(series["voltage"][-1]),
+                stratumDiff=1000,
+                sharesAccepted=int(series["sharesAccepted"][-1]),
+                sharesRejected=int(series["sharesRejected"][-1]),
+                currentStratumUrl=POOL_URLS[int(series["stratum_index"][-1])],
+            ))
+            session.commit()
+            logger.info(f"Generated {count} readings for miner {index + 1}/{miners}")
+
+        backfill_rollups(session)
+        prune_rollups(session, now=end)
+        session.commit()
+
+    logger.info(f"Generated {written} readings of {miners} miners over {days} days "
+                f"in {time.perf_counter() - begin:.1f}s")
+    return written
+
+
+def main(argv=None):
+    """Fill the configured database with synthetic readings."""
+    parser = argparse.ArgumentParser(
+        description="Fill an empty Bitaxe Sentry database (DB_PATH or DB_URL) with synthetic readings")
+    parser.add_argument("-n", "--miners", type=int, default=10, help="Number of miners")
+    parser.add_argument("-d", "--days", type=float, default=30, help="Days of history per miner")
+    parser.add_argument("-i", "--interval", type=float, default=60, help="Seconds between readings of a miner")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random values")
+    args = parser.parse_args(argv)
+
+    init_db()
+    try:
+        generate_fleet(args.miners, args.days, args.interval, seed=args.seed)
+    except ValueError as e:
+        parser.error(str(e))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,6 +2,7 @@ import datetime
 import os
 import pathlib
 
+from sqlalchemy import Index, event
 from sqlmodel import Field, Session, SQLModel, create_engine
 
 DB_URL = os.getenv("DB_URL", None)
@@ -31,30 +32,213 @@ class Miner(SQLModel, table=True):
 
 
 class Reading(SQLModel, table=True):
+    __table_args__ = (
+        # Per-miner latest/history lookups
+        Index("ix_reading_miner_id_timestamp", "miner_id", "timestamp"),
+        # Fleet-wide time range scans and retention cleanup
+        Index("ix_reading_timestamp", "timestamp"),
+    )
+
     id: int = Field(default=None, primary_key=True)
     miner_id: int = Field(foreign_key="miner.id")
     timestamp: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)
     hash_rate: float
     temperature: float
-    best_diff: str
+    best_diff: float  # Parsed value; the reported string is kept in best_diff_event
     voltage: float = Field(default=0.0)  # Voltage in millivolts
     stratumDiff: int = Field(default=0)
     sharesAccepted: int = Field(default=0)
     sharesRejected: int = Field(default=0)
-    currentStratumUrl: str = Field(default="")
+    stratum_id: int = Field(default=None, nullable=True, foreign_key="stratum_endpoint.id")
     # Additional fields can be added here as needed
 
 
-# Create SQLite engine
+class StratumEndpoint(SQLModel, table=True):
+    """Pool URLs, stored once and referenced by readings."""
+    __tablename__ = "stratum_endpoint"
+
+    id: int = Field(default=None, primary_key=True)
+    url: str = Field(unique=True)
+
+
+class BestDiffEvent(SQLModel, table=True):
+    """A change of a miner's best difficulty, as reported by the miner."""
+    __tablename__ = "best_diff_event"
+
+    miner_id: int = Field(primary_key=True, foreign_key="miner.id")
+    timestamp: datetime.datetime = Field(primary_key=True)  # Reading that reported the new value
+    best_diff: str  # e.g. "4.29G"
+    value: float  # Parsed best_diff
+
+
+class MinerState(SQLModel, table=True):
+    """Latest reading of each miner, kept up to date when readings are stored."""
+    __tablename__ = "miner_state"
+
+    miner_id: int = Field(primary_key=True, foreign_key="miner.id")
+    last_seen: datetime.datetime  # Timestamp of the latest reading
+    hash_rate: float
+    temperature: float
+    best_diff: str
+    voltage: float = Field(default=0.0)
+    stratumDiff: int = Field(default=0)
+    sharesAccepted: int = Field(default=0)
+    sharesRejected: int = Field(default=0)
+    currentStratumUrl: str = Field(default="")
+
+
+class ReadingRollup(SQLModel, table=True):
+    """Min/max/avg of a miner's readings over a fixed time bucket."""
+    __tablename__ = "reading_rollup"
+    __table_args__ = (
+        # Fleet-wide range scans at one resolution and rollup pruning
+        Index("ix_reading_rollup_resolution_bucket_start", "resolution", "bucket_start"),
+    )
+
+    miner_id: int = Field(primary_key=True, foreign_key="miner.id")
+    resolution: int = Field(primary_key=True)  # Bucket width in seconds
+    bucket_start: datetime.datetime = Field(primary_key=True)
+    count: int
+    hash_rate_min: float
+    hash_rate_max: float
+    hash_rate_avg: float
+    temperature_min: float
+    temperature_max: float
+    temperature_avg: float
+    voltage_min: float
+    voltage_max: float
+    voltage_avg: float
+
+
+class AlertState(SQLModel, table=True):
+    """State of one alert condition of a miner, so alerts fire once per episode."""
+    __tablename__ = "alert_state"
+
+    miner_id: int = Field(primary_key=True, foreign_key="miner.id")
+    condition: str = Field(primary_key=True)  # "temperature", "voltage" or "offline"
+    state: str = Field(default="ok")  # "ok" or "firing"
+    since: datetime.datetime  # When the current state was entered
+    value: float = Field(default=None, nullable=True)  # Value that triggered the current state
+    notified: bool = Field(default=False)  # Whether the current firing episode was notified
+    last_notified_at: datetime.datetime = Field(default=None, nullable=True)
+
+
+class PollLease(SQLModel, table=True):
+    """
+    The poll cycle polling a miner endpoint, so the sentry and the web app
+    never poll the same miner at the same time (see lease.py).
+    """
+    __tablename__ = "poll_lease"
+
+    endpoint: str = Field(primary_key=True)
+    cycle_id: str  # Cycle holding the lease, or the last one that held it
+    owner: str  # host:pid of the process running the cycle
+    acquired_at: datetime.datetime
+    expires_at: datetime.datetime  # Held until then; set to the release time when the cycle ends
+    status: str = Field(default=None, nullable=True)  # Result of the cycle (poller.OK, SUSPECT or OFFLINE)
+
+
+class WorkerHeartbeat(SQLModel, table=True):
+    """A sentry worker sharing the miners with the other live workers (see sharding.py)."""
+    __tablename__ = "worker_heartbeat"
+
+    worker_id: str = Field(primary_key=True)
+    hostname: str
+    started_at: datetime.datetime
+    last_seen: datetime.datetime  # Workers not seen within the timeout are considered dead
+
+
+class SchemaVersion(SQLModel, table=True):
+    """Schema migrations that have been applied to the database."""
+    __tablename__ = "schema_version"
+
+    version: int = Field(primary_key=True)
+    description: str
+    applied_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)
+
+
+# Values of a polled reading mirrored into MinerState. The state keeps the
+# strings as reported; readings store them normalized (see ingest).
+STATE_FIELDS = (
+    "hash_rate",
+    "temperature",
+    "best_diff",
+    "voltage",
+    "stratumDiff",
+    "sharesAccepted",
+    "sharesRejected",
+    "currentStratumUrl",
+)
+
+
+# SQLite tuning, applied to every new connection. WAL lets the web app read
+# while the poller writes; synchronous=NORMAL is durable across application
+# crashes in WAL mode. cache_size is in KiB, mmap_size in bytes.
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 10000))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", 32768))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", 268435456))
+
+
+def configure_sqlite_connection(dbapi_connection, read_only=False):
+    """
+    Apply the SQLite pragmas to a new DBAPI connection.
+
+    Args:
+        dbapi_connection: sqlite3 connection
+        read_only: Reject writes on this connection (PRAGMA query_only)
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        if not read_only:
+            # The journal mode is stored in the database file; only writers change it
+            cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+    finally:
+        cursor.close()
+
+
+# Create the database engine used for writes
 engine = create_engine(DB_URL, echo=False)
 
+# Engine for the web app's read-only requests. With SQLite it uses separate
+# connections that cannot write; other databases share the main engine.
+if engine.dialect.name == "sqlite":
+    read_engine = create_engine(DB_URL, echo=False)
+
+    @event.listens_for(engine, "connect")
+    def _configure_write_connection(dbapi_connection, connection_record):
+        configure_sqlite_connection(dbapi_connection)
+
+    @event.listens_for(read_engine, "connect")
+    def _configure_read_connection(dbapi_connection, connection_record):
+        configure_sqlite_connection(dbapi_connection, read_only=True)
+else:
+    read_engine = engine
+
 
 def init_db():
-    """Initialize the database by creating all tables."""
+    """Initialize the database by creating all tables and applying migrations."""
+    from .migrations import run_migrations
+
     SQLModel.metadata.create_all(engine)
+    run_migrations(engine)
 
 
 def get_session():
     """Get a database session."""
     with Session(engine) as session:
         yield session
+
+
+def get_read_session():
+    """Get a database session for requests that only read."""
+    with Session(read_engine) as session:
+        yield session
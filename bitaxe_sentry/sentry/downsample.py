@@ -0,0 +1,91 @@
+import numpy as np
+
+# Default cap on points per chart series
+DEFAULT_MAX_POINTS = 500
+
+
+def lttb_indices(x, y, threshold):
+    """
+    Select points with the Largest-Triangle-Three-Buckets algorithm.
+
+    The first and last points are always kept. The points in between are split
+    into threshold - 2 buckets and from each bucket the point forming the
+    largest triangle with the previously selected point and the average of the
+    next bucket is kept. The area computation is vectorized per bucket.
+
+    Args:
+        x: Increasing x values (e.g. epoch seconds)
+        y: Values to preserve the shape of
+        threshold: Number of points to keep
+
+    Returns:
+        numpy.ndarray: Increasing indices of the selected points
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # Bucket boundaries over the inner points 1..n-2; every bucket is non-empty
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x[:n - 1], edges[:-1]) / counts
+    avg_y = np.add.reduceat(y[:n - 1], edges[:-1]) / counts
+
+    # The third triangle vertex is the next bucket's average, or the last point
+    next_x = np.append(avg_x[1:], x[-1])
+    next_y = np.append(avg_y[1:], y[-1])
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        ax, ay = x[a], y[a]
+        area = np.abs((ax - next_x[i]) * (y[start:end] - ay) - (ax - x[start:end]) * (next_y[i] - ay))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+
+    return selected
+
+
+def downsample_indices(x, columns, max_points):
+    """
+    Select at most max_points points for several series sharing the same x values.
+
+    The point budget is split between the columns that are not constant, each
+    is reduced with LTTB independently and the union of the selected points is
+    returned, so every series keeps its own peaks. When the budget leaves
+    fewer than 3 points per column, a single LTTB pass runs over the sum of
+    the columns scaled to their ranges instead.
+
+    Args:
+        x: Increasing x values
+        columns: List of y value sequences, each as long as x
+        max_points: Maximum number of points to keep
+
+    Returns:
+        numpy.ndarray: Increasing indices into x
+    """
+    n = len(x)
+    if n <= max_points:
+        return np.arange(n)
+    if max_points < 3:
+        return np.array([0, n - 1])[:max_points]
+
+    # Flat series are fully described by their endpoints
+    varying = [y for y in (np.asarray(column, dtype=float) for column in columns) if np.ptp(y) > 0]
+    if not varying:
+        return np.array([0, n - 1])
+
+    # Shared endpoints are counted once per column, so the union stays within max_points
+    per_column = (max_points - 2) // len(varying) + 2
+    if per_column < 3:
+        combined = sum((y - y.min()) / np.ptp(y) for y in varying)
+        return lttb_indices(x, combined, max_points)
+    selected = [lttb_indices(x, y, per_column) for y in varying]
+    return np.unique(np.concatenate(selected))
+
@@ -0,0 +1,289 @@
+import argparse
+import csv
+import datetime
+import io
+import logging
+import sys
+
+from sqlalchemy import or_
+from sqlmodel import Session, select
+
+from .db import Miner, Reading, StratumEndpoint, read_engine
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet and Arrow exports need the optional pyarrow package
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+# Readings fetched per query; bounds the memory used by an export
+EXPORT_BATCH_SIZE = 5000
+
+# Rows per Parquet row group and Arrow record batch
+ROW_GROUP_SIZE = 50000
+
+EXPORT_COLUMNS = (
+    "miner_id", "miner", "timestamp", "hash_rate", "temperature", "voltage", "best_diff",
+    "stratumDiff", "sharesAccepted", "sharesRejected", "stratum_url",
+)
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
+
+
+class ExportError(ValueError):
+    """Raised when an export cannot be produced with the given options."""
+
+
+def available_formats():
+    """Export formats supported by the installed packages."""
+    return [fmt for fmt in EXPORT_FORMATS if fmt == "csv" or pa is not None]
+
+
+def to_utc(value):
+    """Convert a datetime to the naive UTC form stored in the database."""
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def iter_reading_batches(engine=read_engine, miner_ids=None, start=None, end=None, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Read the readings of a time range in batches, miner by miner in time order.
+
+    Every batch is a separate query that continues after the last reading of
+    the previous one on the (miner_id, timestamp) index, so memory use does not
+    depend on the size of the export and no read transaction stays open for
+    its whole duration, which would hold back SQLite's WAL checkpoints.
+
+    Args:
+        engine: Database engine to read from
+        miner_ids: Miners to export, all miners if None
+        start: Only readings after this naive UTC datetime
+        end: Only readings up to this naive UTC datetime
+        batch_size: Readings per query
+
+    Yields:
+        list: Row tuples in the order of EXPORT_COLUMNS
+    """
+    with Session(engine) as session:
+        query = select(Miner.id, Miner.name).order_by(Miner.id)
+        if miner_ids is not None:
+            query = query.where(Miner.id.in_(miner_ids))
+        miners = session.exec(query).all()
+
+    for miner_id, name in miners:
+        last = None
+        while True:
+            query = (
+                select(
+                    Reading.id, Reading.timestamp, Reading.hash_rate, Reading.temperature, Reading.voltage,
+                    Reading.best_diff, Reading.stratumDiff, Reading.sharesAccepted, Reading.sharesRejected,
+                    StratumEndpoint.url,
+                )
+                .outerjoin(StratumEndpoint, StratumEndpoint.id == Reading.stratum_id)
+                .where(Reading.miner_id == miner_id)
+                .order_by(Reading.timestamp, Reading.id)
+                .limit(batch_size)
+            )
+            if start is not None:
+                query = query.where(Reading.timestamp > start)
+            if end is not None:
+                query = query.where(Reading.timestamp <= end)
+            if last is not None:
+                last_timestamp, last_id = last
+                query = query.where(
+                    Reading.timestamp >= last_timestamp,
+                    or_(Reading.timestamp > last_timestamp, Reading.id > last_id),
+                )
+
+            with Session(engine) as session:
+                rows = session.exec(query).all()
+            if not rows:
+                break
+            last = rows[-1][1], rows[-1][0]
+            yield [(miner_id, name) + tuple(row[1:]) for row in rows]
+            if len(rows) < batch_size:
+                break
+
+
+def csv_chunks(batches):
+    """Encode batches of readings as CSV, one chunk per batch."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in batches:
+        writer.writerows(
+            row[:2] + (row[2].isoformat() + "Z",) + row[3:]
+            for row in rows
+        )
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Writable file that collects what pyarrow writes until it is drained."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def arrow_schema():
+    return pa.schema([
+        ("miner_id", pa.int64()),
+        ("miner", pa.string()),
+        ("timestamp", pa.timestamp("us", tz="UTC")),
+        ("hash_rate", pa.float64()),
+        ("temperature", pa.float64()),
+        ("voltage", pa.float64()),
+        ("best_diff", pa.float64()),
+        ("stratumDiff", pa.int64()),
+        ("sharesAccepted", pa.int64()),
+        ("sharesRejected", pa.int64()),
+        ("stratum_url", pa.string()),
+    ])
+
+
+def _record_batches(batches, schema):
+    """Convert batches of readings to Arrow record batches of about ROW_GROUP_SIZE rows."""
+    pending, pending_rows = [], 0
+    for rows in batches:
+        columns = list(zip(*rows))
+        pending.append(pa.record_batch(
+            [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+            schema=schema,
+        ))
+        pending_rows += len(rows)
+        if pending_rows >= ROW_GROUP_SIZE:
+            yield pa.Table.from_batches(pending, schema=schema)
+            pending, pending_rows = [], 0
+    if pending:
+        yield pa.Table.from_batches(pending, schema=schema)
+
+
+def arrow_chunks(batches, fmt):
+    """
+    Encode batches of readings as Parquet or as an Arrow IPC stream.
+
+    Only the rows of one row group are held in memory; the encoded bytes are
+    yielded after each row group is written.
+    """
+    schema = arrow_schema()
+    sink = _ChunkSink()
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema)
+    else:
+        writer = pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), schema)
+    try:
+        for table in _record_batches(batches, schema):
+            if fmt == "parquet":
+                writer.write_table(table, row_group_size=table.num_rows)
+            else:
+                writer.write_table(table, max_chunksize=table.num_rows)
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def export_chunks(fmt, miner_ids=None, start=None, end=None, engine=read_engine):
+    """
+    Stream the readings of a miner set and time range in an export format.
+
+    Args:
+        fmt: One of EXPORT_FORMATS
+        miner_ids: Miners to export, all miners if None
+        start: Only readings after this datetime
+        end: Only readings up to this datetime
+        engine: Database engine to read from
+
+    Returns:
+        generator: Encoded chunks of the export
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ExportError(f"Unknown export format: {fmt}")
+    if fmt not in available_formats():
+        raise ExportError(f"{fmt} export requires the pyarrow package")
+
+    start, end = to_utc(start), to_utc(end)
+    if start is not None and end is not None and start >= end:
+        raise ExportError("start must be before end")
+
+    batches = iter_reading_batches(engine, miner_ids, start, end)
+    if fmt == "csv":
+        return csv_chunks(batches)
+    return arrow_chunks(batches, fmt)
+
+
+def export_filename(fmt, now=None):
+    now = now or datetime.datetime.utcnow()
+    return f"bitaxe-readings-{now:%Y%m%d-%H%M%S}.{EXPORT_FORMATS[fmt][1]}"
+
+
+def _parse_time(value):
+    try:
+        return datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid ISO 8601 time: {value}")
+
+
+def main(argv=None):
+    """Export readings from the command line."""
+    parser = argparse.ArgumentParser(description="Export Bitaxe Sentry readings")
+    parser.add_argument("-f", "--format", choices=sorted(EXPORT_FORMATS), default="csv", help="Output format")
+    parser.add_argument("-m", "--miner", type=int, action="append", dest="miner_ids",
+                        help="Miner ID to export; repeat for several miners (default: all)")
+    parser.add_argument("--start", type=_parse_time, help="Only readings after this ISO 8601 time (UTC if no offset)")
+    parser.add_argument("--end", type=_parse_time, help="Only readings up to this ISO 8601 time (UTC if no offset)")
+    parser.add_argument("-o", "--output", help="Output file (default: standard output)")
+    args = parser.parse_args(argv)
+
+    try:
+        chunks = export_chunks(args.format, args.miner_ids, args.start, args.end)
+    except ExportError as e:
+        parser.error(str(e))
+
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    written = 0
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+            written += len(chunk)
+    finally:
+        if args.output:
+            out.close()
+        else:
+            out.flush()
+    logger.info(f"Exported {written} bytes of {args.format}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+import logging
+import random
+import threading
+import time
+
+from .metrics import OPEN_CIRCUITS
+
+logger = logging.getLogger(__name__)
+
+# Consecutive failed polls after which a miner is only probed now and then
+FAILURE_THRESHOLD = 3
+
+# Wait before the first probe of a failed miner; doubled after every failed
+# probe up to the maximum
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 900
+
+# Random spread of the backoff, so miners that failed together (e.g. after a
+# power cut) are not all probed in the same cycle
+BACKOFF_JITTER = 0.1
+
+# A probe without a result after this many seconds is assumed lost
+PROBE_EXPIRY_SECONDS = 60
+
+CLOSED = "closed"  # Polled normally
+OPEN = "open"  # Not polled until the backoff has passed
+HALF_OPEN = "half-open"  # One probe in flight
+
+
+class EndpointHealth:
+    """Consecutive failures and circuit state of one miner endpoint."""
+
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.retry_at = None  # Time the next probe is allowed while open
+        self.probe_started = None
+        self.last_error = None
+
+
+class HealthTracker:
+    """
+    Per-endpoint circuit breaker for miner polls.
+
+    A miner that fails FAILURE_THRESHOLD polls in a row is no longer polled.
+    Once its backoff has passed, a single probe with short timeouts is let
+    through: if it succeeds the miner is polled normally again, otherwise the
+    backoff doubles. Powered-off miners thus cost one cheap request every few
+    minutes instead of a full timeout every cycle, and are still noticed when
+    they come back.
+    """
+
+    def __init__(self, threshold=FAILURE_THRESHOLD, backoff_base=BACKOFF_BASE_SECONDS,
+                 backoff_max=BACKOFF_MAX_SECONDS, jitter=BACKOFF_JITTER):
+        self.threshold = threshold
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def _update_gauge(self):
+        OPEN_CIRCUITS.set(sum(1 for health in self._endpoints.values() if health.state != CLOSED))
+
+    def allow(self, endpoint, now=None):
+        """
+        Decide whether an endpoint may be requested now.
+
+        An open circuit whose backoff has passed turns half-open and this call
+        lets its probe through; is_probe() then returns True until the result
+        is recorded.
+
+        Returns:
+            bool: True if the endpoint should be requested
+        """
+        now = now or time.time()
+        with self._lock:
+            health = self._endpoints.get(endpoint)
+            if health is None or health.state == CLOSED:
+                return True
+            if health.state == HALF_OPEN and now - health.probe_started < PROBE_EXPIRY_SECONDS:
+                return False
+            if health.state == OPEN and now < health.retry_at:
+                return False
+            health.state = HALF_OPEN
+            health.probe_started = now
+            return True
+
+    def is_probe(self, endpoint):
+        """Whether the next request to the endpoint is a half-open probe."""
+        with self._lock:
+            health = self._endpoints.get(endpoint)
+            return health is not None and health.state == HALF_OPEN
+
+    def record_success(self, endpoint):
+        with self._lock:
+            health = self._endpoints.pop(endpoint, None)
+            if health is not None and health.state != CLOSED:
+                logger.info(f"Miner at {endpoint} is responding again after {health.failures} failed polls")
+                self._update_gauge()
+
+    def record_failure(self, endpoint, error, now=None):
+        """
+        Count a failed request and open the circuit once the threshold is reached.
+
+        Returns:
+            float: Time of the next allowed request, or None if still polled normally
+        """
+        now = now or time.time()
+        with self._lock:
+            health = self._endpoints.setdefault(endpoint, EndpointHealth())
+            health.failures += 1
+            health.last_error = error
+            if health.failures < self.threshold:
+                return None
+
+            doublings = min(health.failures - self.threshold, 16)
+            backoff = min(self.backoff_base * 2 ** doublings, self.backoff_max)
+            backoff *= 1 + random.uniform(-self.jitter, self.jitter)
+            if health.state == CLOSED:
+                logger.warning(f"Miner at {endpoint} failed {health.failures} polls in a row, "
+                               f"only probing it from now on (next in {backoff:.0f}s)")
+            else:
+                logger.debug(f"Probe of {endpoint} failed, next probe in {backoff:.0f}s")
+            health.state = OPEN
+            health.retry_at = now + backoff
+            health.probe_started = None
+            self._update_gauge()
+            return health.retry_at
+
+    def retry_at(self, endpoint):
+        """Time the endpoint's next probe is allowed, or None if it is polled normally."""
+        with self._lock:
+            health = self._endpoints.get(endpoint)
+            return health.retry_at if health is not None and health.state == OPEN else None
+
+    def retain(self, endpoints):
+        """Forget endpoints that are no longer configured."""
+        endpoints = set(endpoints)
+        with self._lock:
+            for endpoint in list(self._endpoints):
+                if endpoint not in endpoints:
+                    del self._endpoints[endpoint]
+            self._update_gauge()
+
+
+endpoint_health = HealthTracker()
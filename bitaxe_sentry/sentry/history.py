@@ -0,0 +1,220 @@
+import datetime
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from sqlalchemy import func
+from sqlmodel import select
+
+from .db import MinerState, Reading, ReadingRollup
+from .downsample import downsample_indices
+from .rollup import select_resolution
+
+logger = logging.getLogger(__name__)
+
+# Values plotted on the history charts and the decimals they are sent with
+CHART_METRICS = {"hash_rate": 2, "temperature": 2, "voltage": 3}
+
+# Selectable history windows in hours; windows longer than RAW_HISTORY_HOURS are served from rollups
+HISTORY_WINDOWS = [1, 6, 24, 168, 720, 8760]
+RAW_HISTORY_HOURS = 24
+
+# Number of RawHistory snapshots kept (one per miner filter)
+CACHE_SIZE = 8
+
+
+def _split_by_miner(miner_ids, t, columns):
+    """
+    Split arrays sorted by (miner, time) into per-miner slices.
+
+    Returns:
+        dict: Mapping of miner ID to (t, {metric: values})
+    """
+    if len(miner_ids) == 0:
+        return {}
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(miner_ids)) + 1))
+    ends = np.append(starts[1:], len(miner_ids))
+    return {
+        int(miner_ids[start]): (t[start:end], {metric: values[start:end] for metric, values in columns.items()})
+        for start, end in zip(starts, ends)
+    }
+
+
+def _to_epoch(timestamps):
+    """Convert a sequence of naive UTC datetimes to epoch seconds."""
+    return np.array(timestamps, dtype="datetime64[us]").astype(np.int64) / 1e6
+
+
+class RawHistory:
+    """The last 24 hours of readings as sorted numeric arrays per miner."""
+
+    def __init__(self, latest, series):
+        """
+        Args:
+            latest: Timestamp of the newest reading; windows end here
+            series: Mapping of miner ID to (epoch seconds, {metric: values})
+        """
+        self.latest = latest
+        self.series = series
+
+    def window(self, hours):
+        """
+        Cut the trailing `hours` of every miner's series with a binary search.
+
+        Returns:
+            dict: Mapping of miner ID to (epoch seconds, {metric: values})
+        """
+        cutoff = _to_epoch([self.latest - datetime.timedelta(hours=hours)])[0]
+        windowed = {}
+        for miner_id, (t, columns) in self.series.items():
+            start = np.searchsorted(t, cutoff, side="right")
+            if start < len(t):
+                windowed[miner_id] = (t[start:], {metric: values[start:] for metric, values in columns.items()})
+
+        if logger.isEnabledFor(logging.DEBUG):
+            for miner_id, (t, _) in windowed.items():
+                logger.debug(f"Window {hours}h for miner {miner_id}: {len(t)} points from "
+                             f"{datetime.datetime.utcfromtimestamp(t[0]):%H:%M:%S} to "
+                             f"{datetime.datetime.utcfromtimestamp(t[-1]):%H:%M:%S}")
+        return windowed
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def load_raw_history(session, miner_id=None):
+    """
+    Load the last 24 hours of readings, reusing the previous snapshot while no
+    newer reading has been stored.
+
+    Args:
+        session: Open database session
+        miner_id: Restrict to a single miner
+
+    Returns:
+        RawHistory: Arrays for all miners, or only the selected one
+    """
+    now = datetime.datetime.utcnow()
+    cutoff = now - datetime.timedelta(hours=RAW_HISTORY_HOURS)
+
+    # The latest-state table tells whether anything changed since the cached load
+    latest_query = select(func.max(MinerState.last_seen))
+    if miner_id:
+        latest_query = latest_query.where(MinerState.miner_id == miner_id)
+    latest = session.exec(latest_query).first()
+    if latest is None or latest <= cutoff:
+        # No readings in the last 24 hours; windows end at the current time
+        return RawHistory(now, {})
+
+    key = (miner_id, latest)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    query = select(
+        Reading.miner_id, Reading.timestamp, Reading.hash_rate, Reading.temperature, Reading.voltage
+    ).where(Reading.timestamp > cutoff)
+    if miner_id:
+        query = query.where(Reading.miner_id == miner_id)
+    rows = session.exec(query.order_by(Reading.miner_id, Reading.timestamp)).all()
+
+    if rows:
+        miner_ids, timestamps, hash_rates, temperatures, voltages = zip(*rows)
+        columns = {
+            "hash_rate": np.array(hash_rates, dtype=float),
+            "temperature": np.array(temperatures, dtype=float),
+            # Ensure voltage has a default value if it's None
+            "voltage": np.nan_to_num(np.array(voltages, dtype=float), nan=0.0),
+        }
+        series = _split_by_miner(np.array(miner_ids), _to_epoch(timestamps), columns)
+    else:
+        series = {}
+
+    history = RawHistory(latest, series)
+    logger.debug(f"Loaded {len(rows)} readings for {len(series)} miners ending at {latest}")
+
+    with _cache_lock:
+        _cache[key] = history
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return history
+
+
+def load_rollup_history(session, hours, miner_id=None):
+    """
+    Load bucket averages at the resolution chosen for a long time range.
+
+    Returns:
+        dict: Mapping of miner ID to (epoch seconds, {metric: values})
+    """
+    resolution = select_resolution(hours)
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(hours=hours)
+    query = select(
+        ReadingRollup.miner_id,
+        ReadingRollup.bucket_start,
+        ReadingRollup.hash_rate_avg,
+        ReadingRollup.temperature_avg,
+        ReadingRollup.voltage_avg,
+    ).where(
+        ReadingRollup.resolution == resolution,
+        ReadingRollup.bucket_start > cutoff,
+    )
+    if miner_id:
+        query = query.where(ReadingRollup.miner_id == miner_id)
+    rows = session.exec(query.order_by(ReadingRollup.miner_id, ReadingRollup.bucket_start)).all()
+
+    logger.info(f"Serving {hours}h history from {resolution}s rollups ({len(rows)} buckets)")
+    if not rows:
+        return {}
+
+    miner_ids, starts, hash_rates, temperatures, voltages = zip(*rows)
+    columns = {
+        "hash_rate": np.array(hash_rates, dtype=float),
+        "temperature": np.array(temperatures, dtype=float),
+        "voltage": np.array(voltages, dtype=float),
+    }
+    return _split_by_miner(np.array(miner_ids), _to_epoch(starts), columns)
+
+
+def columnar_series(t, columns, max_points):
+    """
+    Downsample one miner's series and convert it to parallel lists.
+
+    Returns:
+        dict: "t" holds epoch seconds, each chart metric holds its values
+    """
+    keep = downsample_indices(t, list(columns.values()), max_points)
+    series = {"t": t[keep].astype(np.int64).tolist()}
+    for metric, decimals in CHART_METRICS.items():
+        series[metric] = np.round(columns[metric][keep], decimals).tolist()
+    return series
+
+
+def history_series(session, miner_names, hours, max_points, miner_id=None):
+    """
+    Build the chart series of one history window.
+
+    Args:
+        session: Open database session
+        miner_names: Mapping of miner ID to display name
+        hours: Window length, one of HISTORY_WINDOWS
+        max_points: Maximum points per miner
+        miner_id: Restrict to a single miner
+
+    Returns:
+        dict: Mapping of miner name to columnar series
+    """
+    if hours > RAW_HISTORY_HOURS:
+        windowed = load_rollup_history(session, hours, miner_id)
+    else:
+        windowed = load_raw_history(session, miner_id).window(hours)
+
+    return {
+        miner_names[mid]: columnar_series(t, columns, max_points)
+        for mid, (t, columns) in windowed.items()
+        if mid in miner_names
+    }
@@ -0,0 +1,244 @@
+import logging
+import time
+
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import select
+
+from .db import STATE_FIELDS, BestDiffEvent, Miner, MinerState, Reading, StratumEndpoint
+from .metrics import DB_COMMIT_SECONDS
+from .rollup import update_rollups
+
+logger = logging.getLogger(__name__)
+
+# Suffixes AxeOS uses when formatting difficulties
+DIFFICULTY_SUFFIXES = {
+    "k": 1e3,
+    "K": 1e3,
+    "M": 1e6,
+    "G": 1e9,
+    "T": 1e12,
+    "P": 1e15,
+    "E": 1e18,
+}
+
+# Pool URL -> StratumEndpoint.id of committed rows. The table is only ever
+# appended to, so entries never go stale.
+_stratum_ids = {}
+
+# Rows per INSERT statement. Each reading binds 10 parameters, so this stays
+# below the 999 bound-parameter limit of older SQLite builds.
+INSERT_BATCH_SIZE = 90
+
+
+def get_or_create_miners(session, endpoints):
+    """
+    Look up the miner record for every endpoint, registering unknown ones.
+
+    New miners are flushed so they receive an ID but are not committed; they
+    become visible together with the readings of the cycle.
+
+    Args:
+        session: Open database session
+        endpoints: List of miner base URLs
+
+    Returns:
+        dict: Mapping of endpoint URL to Miner
+    """
+    # Only the requested miners are loaded; a scheduler batch is a small part of the fleet
+    miners = {miner.endpoint: miner
+              for miner in session.exec(select(Miner).where(Miner.endpoint.in_(endpoints))).all()}
+
+    new_miners = []
+    for endpoint_url in endpoints:
+        if endpoint_url not in miners:
+            logger.info(f"Registering new miner at {endpoint_url}")
+            miner = Miner(name=f"bitaxe_{endpoint_url.split('://')[-1]}", endpoint=endpoint_url)
+            miners[endpoint_url] = miner
+            new_miners.append(miner)
+
+    if new_miners:
+        session.add_all(new_miners)
+        session.flush()
+
+    return miners
+
+
+def parse_difficulty(value):
+    """
+    Convert a difficulty as reported by AxeOS ("4.29G", "523k", 1234) to a number.
+
+    Returns:
+        float: The difficulty, 0.0 if it cannot be parsed
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value or "").strip()
+    if not text:
+        return 0.0
+    multiplier = 1.0
+    if text and text[-1] in DIFFICULTY_SUFFIXES:
+        multiplier = DIFFICULTY_SUFFIXES[text[-1]]
+        text = text[:-1].strip()
+    try:
+        return float(text) * multiplier
+    except ValueError:
+        logger.warning(f"Could not parse difficulty {value!r}")
+        return 0.0
+
+
+def insert_ignoring_duplicates(session, model, rows):
+    """Insert rows, skipping those that violate a unique constraint."""
+    dialect = session.get_bind().dialect.name
+    if dialect == "sqlite":
+        statement = sqlite.insert(model).on_conflict_do_nothing()
+    elif dialect == "postgresql":
+        statement = postgresql.insert(model).on_conflict_do_nothing()
+    else:
+        statement = insert(model).prefix_with("IGNORE")
+    session.exec(statement.values(rows))
+
+
+def get_stratum_ids(session, urls):
+    """
+    Look up the StratumEndpoint ID of every pool URL, adding unknown ones.
+
+    New URLs are inserted in the caller's transaction. Pollers running at the
+    same time may add the same URL, so duplicates are skipped and the IDs read
+    back.
+
+    Args:
+        session: Open database session
+        urls: Pool URLs
+
+    Returns:
+        dict: Mapping of URL to StratumEndpoint ID
+    """
+    ids = {url: _stratum_ids[url] for url in urls if url in _stratum_ids}
+    missing = [url for url in urls if url not in ids]
+    if missing:
+        insert_ignoring_duplicates(session, StratumEndpoint, [{"url": url} for url in missing])
+        ids.update(session.exec(
+            select(StratumEndpoint.url, StratumEndpoint.id).where(StratumEndpoint.url.in_(missing))
+        ).all())
+    return ids
+
+
+def reading_values(row, stratum_ids):
+    """
+    Convert a polled reading into Reading column values.
+
+    Args:
+        row: Dict with the values of a polled reading, as built by the poller
+        stratum_ids: Mapping of pool URL to StratumEndpoint ID
+
+    Returns:
+        dict: Column values for a Reading row
+    """
+    values = {key: value for key, value in row.items() if key != "currentStratumUrl"}
+    values["best_diff"] = parse_difficulty(row["best_diff"])
+    values["stratum_id"] = stratum_ids.get(row["currentStratumUrl"])
+    return values
+
+
+def best_diff_events(rows, states):
+    """
+    Return a BestDiffEvent row for each reading whose best_diff differs from
+    the miner's latest state.
+
+    Args:
+        rows: Dicts with the values of polled readings
+        states: Mapping of miner ID to MinerState, before the rows are applied
+    """
+    events = []
+    for row in rows:
+        state = states.get(row["miner_id"])
+        if state is None or state.best_diff != row["best_diff"]:
+            events.append({
+                "miner_id": row["miner_id"],
+                "timestamp": row["timestamp"],
+                "best_diff": row["best_diff"],
+                "value": parse_difficulty(row["best_diff"]),
+            })
+    return events
+
+
+def load_miner_states(session, miner_ids=None):
+    """
+    Load the latest known state of every miner.
+
+    Args:
+        session: Open database session
+        miner_ids: Only load the states of these miners
+
+    Returns:
+        dict: Mapping of miner ID to MinerState
+    """
+    query = select(MinerState)
+    if miner_ids is not None:
+        query = query.where(MinerState.miner_id.in_(miner_ids))
+    return {state.miner_id: state for state in session.exec(query).all()}
+
+
+def update_miner_states(session, rows, states):
+    """
+    Apply new readings to the latest-state rows of their miners.
+
+    Args:
+        session: Open database session
+        rows: List of dicts with the values of polled readings
+        states: Mapping of miner ID to MinerState, updated in place
+    """
+    for row in rows:
+        state = states.get(row["miner_id"])
+        if state is None:
+            state = MinerState(miner_id=row["miner_id"], last_seen=row["timestamp"],
+                               **{field: row[field] for field in STATE_FIELDS})
+            states[row["miner_id"]] = state
+            session.add(state)
+        elif row["timestamp"] >= state.last_seen:
+            state.last_seen = row["timestamp"]
+            for field in STATE_FIELDS:
+                setattr(state, field, row[field])
+
+
+def store_readings(session, rows, states=None):
+    """
+    Insert all readings of a polling cycle and commit them in one transaction.
+
+    Pool URLs are stored once in stratum_endpoint and best_diff as a number;
+    the reported best_diff string is logged in best_diff_event whenever it
+    changes. The latest-state row of each miner and the rollup buckets are
+    updated in the same transaction.
+
+    Args:
+        session: Open database session, possibly holding uncommitted miners
+        rows: List of dicts with the values of polled readings, as built by
+              the poller
+        states: Mapping of miner ID to MinerState from load_miner_states(),
+                loaded here if not given
+
+    Returns:
+        float: Seconds spent inserting and committing
+    """
+    start = time.perf_counter()
+    if states is None:
+        states = load_miner_states(session)
+
+    stratum_ids = get_stratum_ids(session, {row["currentStratumUrl"] for row in rows if row["currentStratumUrl"]})
+    values = [reading_values(row, stratum_ids) for row in rows]
+    for i in range(0, len(values), INSERT_BATCH_SIZE):
+        session.exec(insert(Reading).values(values[i:i + INSERT_BATCH_SIZE]))
+    events = best_diff_events(rows, states)
+    for i in range(0, len(events), INSERT_BATCH_SIZE):
+        session.exec(insert(BestDiffEvent).values(events[i:i + INSERT_BATCH_SIZE]))
+
+    update_miner_states(session, rows, states)
+    update_rollups(session, rows)
+    session.commit()
+    _stratum_ids.update(stratum_ids)
+    elapsed = time.perf_counter() - start
+    DB_COMMIT_SECONDS.observe(elapsed)
+
+    logger.info(f"Stored {len(rows)} readings in {elapsed * 1000:.1f} ms")
+    return elapsed
@@ -0,0 +1,130 @@
+import collections
+import datetime
+import logging
+import threading
+import uuid
+
+from .poller import poll_once
+
+logger = logging.getLogger(__name__)
+
+# Finished jobs kept for status requests
+JOB_HISTORY = 50
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+def _isoformat(value):
+    return value.isoformat() + "Z" if value else None
+
+
+class PollJob:
+    """One on-demand poll of all configured miners."""
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.state = QUEUED
+        self.requests = 1  # Number of requests merged into this job
+        self.created_at = datetime.datetime.utcnow()
+        self.started_at = None
+        self.finished_at = None
+        self.total = 0
+        self.completed = 0
+        self.polled_count = None
+        self.error = None
+
+    def advance(self, total=None):
+        """Count one finished miner request, or set the number of miners to poll."""
+        if total is not None:
+            self.total = total
+        else:
+            self.completed += 1
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "state": self.state,
+            "requests": self.requests,
+            "created_at": _isoformat(self.created_at),
+            "started_at": _isoformat(self.started_at),
+            "finished_at": _isoformat(self.finished_at),
+            "progress": {"completed": self.completed, "total": self.total},
+            "polled_count": self.polled_count,
+            "error": self.error,
+        }
+
+
+class PollJobManager:
+    """
+    Run on-demand polls in a background thread, one at a time.
+
+    Requests made while a job is queued join that job, so any number of
+    clicks and settings saves lead to at most one running and one queued
+    poll. A request made while a job is running gets a new queued job, because
+    the running poll may have started before the change that prompted it.
+    """
+
+    def __init__(self, poll=poll_once):
+        self._poll = poll
+        self._cond = threading.Condition()
+        self._jobs = collections.OrderedDict()
+        self._pending = None
+        self._thread = None
+
+    def submit(self):
+        """
+        Request a poll of all miners.
+
+        Returns:
+            PollJob: The queued job this request was added to
+        """
+        with self._cond:
+            if self._pending is not None:
+                self._pending.requests += 1
+                logger.info(f"Poll request merged into queued job {self._pending.id}")
+                return self._pending
+
+            job = PollJob()
+            self._pending = job
+            self._jobs[job.id] = job
+            while len(self._jobs) > JOB_HISTORY:
+                self._jobs.popitem(last=False)
+
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="poll-jobs", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+            logger.info(f"Queued poll job {job.id}")
+            return job
+
+    def get(self, job_id):
+        """Return a job by ID, or None if it is unknown or expired."""
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None:
+                    self._cond.wait()
+                job, self._pending = self._pending, None
+                job.state = RUNNING
+                job.started_at = datetime.datetime.utcnow()
+
+            logger.info(f"Running poll job {job.id} ({job.requests} requests)")
+            try:
+                job.polled_count = self._poll(progress=job.advance)
+                job.state = DONE
+            except Exception as e:
+                logger.exception(f"Poll job {job.id} failed: {e}")
+                job.error = str(e)
+                job.state = FAILED
+            job.finished_at = datetime.datetime.utcnow()
+            logger.info(f"Poll job {job.id} {job.state} in "
+                        f"{(job.finished_at - job.started_at).total_seconds():.1f}s")
+
+
+poll_jobs = PollJobManager()
@@ -0,0 +1,183 @@
+import datetime
+import logging
+import os
+import socket
+import time
+import uuid
+
+from sqlalchemy import bindparam, delete, update
+from sqlmodel import Session, select
+
+from .db import PollLease, engine
+from .ingest import INSERT_BATCH_SIZE, insert_ignoring_duplicates
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks of a lease held by another poll cycle
+WAIT_INTERVAL_SECONDS = 0.5
+
+# Identifies the process holding a lease in logs and the poll_lease table
+OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+# Expired leases of configured miners are kept this long; a miner still being
+# polled renews its lease every cycle
+STALE_LEASE_AGE = datetime.timedelta(days=1)
+
+
+def new_cycle_id():
+    """Return a unique ID for a poll cycle."""
+    return uuid.uuid4().hex
+
+
+def acquire_leases(endpoints, cycle_id, seconds, db_engine=engine):
+    """
+    Lease miner endpoints to a poll cycle.
+
+    An endpoint is leased if it has no lease yet or its lease was released
+    or has expired. Each statement only takes free leases, so of several
+    processes acquiring the same endpoint exactly one gets it.
+
+    Args:
+        endpoints: Miner base URLs
+        cycle_id: ID of the poll cycle, see new_cycle_id()
+        seconds: Time after which the leases are free again if never released
+        db_engine: Engine of the database holding the leases
+
+    Returns:
+        tuple: (endpoints leased to this cycle,
+                dict of endpoint -> cycle ID for those held by other cycles)
+    """
+    endpoints = list(endpoints)
+    if not endpoints:
+        return [], {}
+    now = datetime.datetime.utcnow()
+    lease = {
+        "cycle_id": cycle_id,
+        "owner": OWNER,
+        "acquired_at": now,
+        "expires_at": now + datetime.timedelta(seconds=seconds),
+    }
+
+    with Session(db_engine) as session:
+        # Writing first takes SQLite's write lock before anything is read, so
+        # the transaction waits for other writers instead of failing on a stale snapshot
+        session.exec(
+            update(PollLease)
+            .where(PollLease.endpoint.in_(endpoints), PollLease.expires_at <= now)
+            .values(status=None, **lease)
+        )
+        known = set(session.exec(select(PollLease.endpoint).where(PollLease.endpoint.in_(endpoints))).all())
+        new = [dict(lease, endpoint=endpoint) for endpoint in endpoints if endpoint not in known]
+        for i in range(0, len(new), INSERT_BATCH_SIZE):
+            insert_ignoring_duplicates(session, PollLease, new[i:i + INSERT_BATCH_SIZE])
+        holders = dict(session.exec(
+            select(PollLease.endpoint, PollLease.cycle_id).where(PollLease.endpoint.in_(endpoints))
+        ).all())
+        session.commit()
+
+    leased = [endpoint for endpoint in endpoints if holders.get(endpoint) == cycle_id]
+    held = {endpoint: holders[endpoint] for endpoint in endpoints if holders.get(endpoint, cycle_id) != cycle_id}
+    return leased, held
+
+
+def release_leases(cycle_id, endpoints, statuses, db_engine=engine):
+    """
+    Release the leases of a finished poll cycle and record its results.
+
+    Args:
+        cycle_id: ID of the poll cycle
+        endpoints: Endpoints leased to the cycle
+        statuses: Mapping of endpoint to poll result; endpoints without one
+                  are released without a result, so waiting cycles poll them
+        db_engine: Engine of the database holding the leases
+    """
+    if not endpoints:
+        return
+    now = datetime.datetime.utcnow()
+    table = PollLease.__table__
+    statement = (
+        update(table)
+        .where(table.c.endpoint == bindparam("leased_endpoint"), table.c.cycle_id == cycle_id)
+        .values(status=bindparam("result"), expires_at=now)
+    )
+    with Session(db_engine) as session:
+        session.connection().execute(statement, [
+            {"leased_endpoint": endpoint, "result": statuses.get(endpoint)} for endpoint in endpoints
+        ])
+        session.commit()
+
+
+def wait_for_leases(held, progress=None, db_engine=engine):
+    """
+    Wait for other poll cycles to finish polling endpoints and take their results.
+
+    Args:
+        held: Mapping of endpoint -> ID of the cycle holding it, as returned
+              by acquire_leases()
+        progress: Called without arguments for each endpoint with a result
+        db_engine: Engine of the database holding the leases
+
+    Returns:
+        tuple: (dict of endpoint -> poll result,
+                endpoints whose cycle ended without a result or whose lease
+                expired, so they still need to be polled)
+    """
+    pending = set(held)
+    statuses = {}
+    unresolved = []
+    while pending:
+        time.sleep(WAIT_INTERVAL_SECONDS)
+        now = datetime.datetime.utcnow()
+        with Session(db_engine) as session:
+            leases = {lease.endpoint: lease for lease in session.exec(
+                select(PollLease).where(PollLease.endpoint.in_(list(pending)))
+            ).all()}
+
+        for endpoint in list(pending):
+            lease = leases.get(endpoint)
+            # Acquiring clears the status, so any status is from the holding
+            # cycle or from one that took over its expired lease
+            if lease is not None and lease.status is not None:
+                statuses[endpoint] = lease.status
+                if progress is not None:
+                    progress()
+            elif lease is not None and lease.expires_at > now:
+                continue
+            else:
+                unresolved.append(endpoint)
+            pending.discard(endpoint)
+
+    if unresolved:
+        logger.warning(f"{len(unresolved)} miners were left without a result by another poll cycle")
+    return statuses, unresolved
+
+
+def delete_stale_leases(endpoints, db_engine=engine):
+    """
+    Delete leases that no poll cycle will use again.
+
+    A lease is stale once it expired more than STALE_LEASE_AGE ago or its
+    endpoint is no longer configured. Leases that are still held are kept,
+    so a poll cycle in flight is not disturbed.
+
+    Args:
+        endpoints: Currently configured miner base URLs
+        db_engine: Engine of the database holding the leases
+
+    Returns:
+        int: Number of leases deleted
+    """
+    configured = set(endpoints)
+    now = datetime.datetime.utcnow()
+    with Session(db_engine) as session:
+        expired = session.exec(
+            select(PollLease.endpoint, PollLease.expires_at).where(PollLease.expires_at <= now)
+        ).all()
+        stale = [endpoint for endpoint, expires_at in expired
+                 if endpoint not in configured or expires_at < now - STALE_LEASE_AGE]
+        for i in range(0, len(stale), INSERT_BATCH_SIZE):
+            session.exec(delete(PollLease).where(
+                PollLease.endpoint.in_(stale[i:i + INSERT_BATCH_SIZE]), PollLease.expires_at <= now
+            ))
+        session.commit()
+    return len(stale)
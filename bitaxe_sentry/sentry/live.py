@@ -0,0 +1,212 @@
+import asyncio
+import json
+import logging
+
+from sqlmodel import Session, select
+from starlette.concurrency import run_in_threadpool
+
+from .db import Miner, MinerState, read_engine
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks for new readings
+STREAM_INTERVAL = 1.0
+
+# Seconds without events after which a comment is sent to keep proxies from
+# closing the connection
+KEEPALIVE_INTERVAL = 15
+
+# Events buffered per client. A client that falls further behind is
+# disconnected; the browser reconnects and starts again from a snapshot.
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+def miner_payload(miner, state):
+    """Dashboard fields of one miner as sent to the browser."""
+    return {
+        "id": miner.id,
+        "name": miner.name,
+        "endpoint": miner.endpoint,
+        "last_seen": state.last_seen.isoformat() + "Z",
+        "hash_rate": state.hash_rate,
+        "temperature": state.temperature,
+        "voltage": state.voltage,
+        "best_diff": state.best_diff,
+        "sharesAccepted": state.sharesAccepted,
+        "sharesRejected": state.sharesRejected,
+        "currentStratumUrl": state.currentStratumUrl,
+    }
+
+
+def format_event(event, data):
+    """Encode one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class MinerStateBroadcaster:
+    """
+    Push changes of miner_state to every connected dashboard.
+
+    A single task checks the database once per interval, no matter how many
+    clients are connected, and compares miner_state with the rows it sent
+    last. Only changed rows are sent, encoded once and shared by all clients.
+    With SQLite the table is only read after another connection committed,
+    which PRAGMA data_version reports without touching any table.
+
+    The task runs while there are subscribers.
+    """
+
+    def __init__(self, engine=read_engine, interval=STREAM_INTERVAL):
+        self.engine = engine
+        self.interval = interval
+        self.rows = {}  # Miner ID -> payload last sent to clients
+        self._loaded = False
+        self._subscribers = set()
+        self._pending = set()  # Subscribers waiting for the first snapshot
+        self._task = None
+        self._conn = None
+        self._data_version = None
+
+    def _database_changed(self):
+        if self.engine.dialect.name != "sqlite":
+            return True
+        # data_version is per connection, so the same one is kept between checks
+        if self._conn is None:
+            self._conn = self.engine.connect()
+        try:
+            version = self._conn.exec_driver_sql("PRAGMA data_version").scalar()
+        finally:
+            # End the read transaction so it does not hold back WAL checkpoints
+            self._conn.rollback()
+        changed = version != self._data_version
+        self._data_version = version
+        return changed
+
+    def _load_changes(self):
+        """
+        Compare miner_state with the rows sent last.
+
+        Returns:
+            tuple: (changed rows, IDs of removed miners), or None if the
+                   database was not written since the last check
+        """
+        if not self._database_changed():
+            return None
+        with Session(self.engine) as session:
+            rows = session.exec(
+                select(Miner, MinerState).join(MinerState, MinerState.miner_id == Miner.id).order_by(Miner.id)
+            ).all()
+        current = {miner.id: miner_payload(miner, state) for miner, state in rows}
+        updated = [row for miner_id, row in current.items() if self.rows.get(miner_id) != row]
+        removed = [miner_id for miner_id in self.rows if miner_id not in current]
+        self.rows = current
+        self._loaded = True
+        return updated, removed
+
+    def _close_connection(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+            self._data_version = None
+
+    def _send(self, queue, event):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            logger.warning("Live stream client is too slow, disconnecting it")
+            self._subscribers.discard(queue)
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(None)
+
+    def _snapshot(self):
+        return format_event("snapshot", list(self.rows.values()))
+
+    async def _poll(self):
+        while self._subscribers:
+            try:
+                changes = await run_in_threadpool(self._load_changes)
+            except Exception as e:
+                logger.exception(f"Error reading miner state for live stream: {e}")
+                changes = None
+
+            if changes:
+                updated, removed = changes
+                events = []
+                if updated:
+                    events.append(format_event("update", updated))
+                if removed:
+                    events.append(format_event("remove", removed))
+                for queue in list(self._subscribers - self._pending):
+                    for event in events:
+                        self._send(queue, event)
+
+            if self._pending and self._loaded:
+                snapshot = self._snapshot()
+                for queue in self._pending:
+                    self._send(queue, snapshot)
+                self._pending.clear()
+
+            await asyncio.sleep(self.interval)
+
+    async def _run(self):
+        while True:
+            try:
+                await self._poll()
+            finally:
+                # The rows go stale while nobody listens, so the next client
+                # waits for a fresh read instead of getting them
+                self.rows = {}
+                self._loaded = False
+                await run_in_threadpool(self._close_connection)
+            # A client that subscribed while the connection was closing found
+            # this task still running, so it is served by this task
+            if not self._subscribers:
+                break
+
+    def subscribe(self):
+        """
+        Register a client.
+
+        Returns:
+            asyncio.Queue: Encoded events for the client; None means the
+                           stream has ended
+        """
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.add(queue)
+        if self._loaded:
+            queue.put_nowait(self._snapshot())
+        else:
+            self._pending.add(queue)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return queue
+
+    def unsubscribe(self, queue):
+        self._subscribers.discard(queue)
+        self._pending.discard(queue)
+
+    async def stream(self, request):
+        """Yield the server-sent events of one client until it disconnects."""
+        queue = self.subscribe()
+        logger.debug(f"Live stream client connected ({len(self._subscribers)} total)")
+        try:
+            # Reconnect quickly after a restart of the web app
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is None:
+                    break
+                yield event
+        finally:
+            self.unsubscribe(queue)
+            logger.debug(f"Live stream client disconnected ({len(self._subscribers)} left)")
+
+
+broadcaster = MinerStateBroadcaster()
@@ -0,0 +1,155 @@
+import logging
+import os
+
+from prometheus_client import REGISTRY, Counter, Gauge, Histogram, start_http_server
+from prometheus_client.core import GaugeMetricFamily
+from sqlmodel import Session, select
+
+from .db import Miner, MinerState
+from .rollup import EPOCH
+
+logger = logging.getLogger(__name__)
+
+# Port of the sentry process's metrics exporter; 0 disables it
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9101))
+
+# Latency buckets in seconds for network calls (miners and webhooks)
+REQUEST_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+MINER_REQUEST_SECONDS = Histogram(
+    "bitaxe_sentry_miner_request_seconds",
+    "Latency of miner /api/system/info requests",
+    buckets=REQUEST_BUCKETS,
+)
+MINER_POLL_FAILURES = Counter(
+    "bitaxe_sentry_miner_poll_failures_total",
+    "Miner requests that failed or returned an error status",
+)
+MINER_POLLS_SKIPPED = Counter(
+    "bitaxe_sentry_miner_polls_skipped_total",
+    "Miner polls skipped because the miner's circuit breaker is open",
+)
+MINER_POLLS_ATTACHED = Counter(
+    "bitaxe_sentry_miner_polls_attached_total",
+    "Miner polls answered by a poll cycle already running in another process",
+)
+OPEN_CIRCUITS = Gauge(
+    "bitaxe_sentry_open_circuits",
+    "Miners that are only probed after repeated failures",
+)
+SHARD_WORKERS = Gauge(
+    "bitaxe_sentry_shard_workers",
+    "Live sentry workers sharing the miners in sharding mode",
+)
+SHARD_MINERS = Gauge(
+    "bitaxe_sentry_shard_miners",
+    "Miners assigned to this sentry worker in sharding mode",
+)
+POLL_CYCLE_SECONDS = Histogram(
+    "bitaxe_sentry_poll_cycle_seconds",
+    "Duration of a polling cycle or scheduler batch",
+    buckets=(0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+DB_COMMIT_SECONDS = Histogram(
+    "bitaxe_sentry_db_commit_seconds",
+    "Time to insert and commit the readings of a polling cycle",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+WEBHOOK_SECONDS = Histogram(
+    "bitaxe_sentry_webhook_request_seconds",
+    "Latency of Discord webhook requests",
+    buckets=REQUEST_BUCKETS,
+)
+WEBHOOK_FAILURES = Counter(
+    "bitaxe_sentry_webhook_failures_total",
+    "Webhook messages that could not be delivered",
+)
+WEBHOOK_RATE_LIMITED = Counter(
+    "bitaxe_sentry_webhook_rate_limited_total",
+    "Webhook requests answered with HTTP 429",
+)
+ALERTS = Counter(
+    "bitaxe_sentry_alerts_total",
+    "Alert notifications produced",
+    ["type"],
+)
+
+
+class FleetCollector:
+    """
+    Export the latest telemetry of every miner as gauges.
+
+    Values are read from miner_state when metrics are scraped, so every
+    process exposes the same view of the fleet. Series are identified by
+    miner_id, which survives renames and tells apart miners sharing a name.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def _families(self):
+        gauges = {
+            "hash_rate": GaugeMetricFamily("bitaxe_miner_hash_rate", "Latest hash rate as reported by the miner", labels=["miner_id", "miner"]),
+            "temperature": GaugeMetricFamily("bitaxe_miner_temperature_celsius", "Latest ASIC temperature", labels=["miner_id", "miner"]),
+            "voltage": GaugeMetricFamily("bitaxe_miner_voltage_volts", "Latest input voltage", labels=["miner_id", "miner"]),
+            "sharesAccepted": GaugeMetricFamily("bitaxe_miner_shares_accepted", "Accepted shares since miner boot", labels=["miner_id", "miner"]),
+            "sharesRejected": GaugeMetricFamily("bitaxe_miner_shares_rejected", "Rejected shares since miner boot", labels=["miner_id", "miner"]),
+        }
+        last_seen = GaugeMetricFamily("bitaxe_miner_last_seen_timestamp_seconds",
+                                      "Time of the latest reading", labels=["miner_id", "miner"])
+        return gauges, last_seen
+
+    def describe(self):
+        # Lets the registry check metric names without querying the database
+        gauges, last_seen = self._families()
+        return list(gauges.values()) + [last_seen]
+
+    def collect(self):
+        gauges, last_seen = self._families()
+
+        try:
+            with Session(self.engine) as session:
+                rows = session.exec(select(Miner.id, Miner.name, MinerState).join(MinerState, MinerState.miner_id == Miner.id)).all()
+        except Exception as e:
+            logger.warning(f"Could not read fleet state for metrics: {e}")
+            return
+
+        for miner_id, name, state in rows:
+            for field, gauge in gauges.items():
+                gauge.add_metric([str(miner_id), name], getattr(state, field) or 0)
+            last_seen.add_metric([str(miner_id), name], (state.last_seen - EPOCH).total_seconds())
+
+        yield from gauges.values()
+        yield last_seen
+
+
+_fleet_registered = False
+
+
+def register_fleet_collector(engine):
+    """Register the fleet gauges with the default registry once per process."""
+    global _fleet_registered
+    if not _fleet_registered:
+        REGISTRY.register(FleetCollector(engine))
+        _fleet_registered = True
+
+
+def start_metrics_server(engine, port=METRICS_PORT):
+    """
+    Serve /metrics from a background thread of the sentry process.
+
+    Returns:
+        bool: True if the exporter was started
+    """
+    register_fleet_collector(engine)
+    if not port:
+        logger.info("Metrics exporter disabled")
+        return False
+    try:
+        start_http_server(port)
+    except OSError as e:
+        logger.error(f"Could not start metrics exporter on port {port}: {e}")
+        return False
+    logger.info(f"Serving Prometheus metrics on port {port}")
+    return True
+
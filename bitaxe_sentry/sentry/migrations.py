@@ -0,0 +1,259 @@
+import datetime
+import logging
+import time
+
+from sqlalchemy import Column, DateTime, Float, Integer, MetaData, String, Table, column, func, inspect, insert, or_, select, table, update
+from sqlmodel import Session
+
+from .cleaner import reclaim_space
+from .db import BestDiffEvent, MinerState, Reading, SchemaVersion, StratumEndpoint
+from .ingest import parse_difficulty
+from .rollup import backfill_rollups
+
+logger = logging.getLogger(__name__)
+
+# Rows per INSERT while filling the best_diff lookup table
+VALUE_BATCH_SIZE = 400
+
+
+def _reading_columns(conn):
+    return {col["name"] for col in inspect(conn).get_columns("reading")}
+
+
+def _legacy_reading(name="reading"):
+    """The reading table as it was before pool URLs and best_diff were normalized."""
+    return table(
+        name,
+        column("id", Integer),
+        column("miner_id", Integer),
+        column("timestamp", DateTime),
+        column("hash_rate", Float),
+        column("temperature", Float),
+        column("best_diff", String),
+        column("voltage", Float),
+        column("stratumDiff", Integer),
+        column("sharesAccepted", Integer),
+        column("sharesRejected", Integer),
+        column("currentStratumUrl", String),
+    )
+
+
+def _create_index(conn, table, name):
+    """Create an index declared on a model if the database does not have it yet."""
+    index = next(ix for ix in table.indexes if ix.name == name)
+    index.create(conn, checkfirst=True)
+
+
+def add_reading_indexes(conn):
+    """Index readings by miner and time, and by time alone."""
+    _create_index(conn, Reading.__table__, "ix_reading_miner_id_timestamp")
+    _create_index(conn, Reading.__table__, "ix_reading_timestamp")
+
+
+def backfill_miner_state(conn):
+    """Populate miner_state from the latest reading of each miner."""
+    # Databases created with the current schema have no readings yet; older
+    # ones still have the pool URL and best_diff strings on every reading
+    if "currentStratumUrl" not in _reading_columns(conn):
+        return
+
+    reading = _legacy_reading()
+    latest = (
+        select(reading.c.miner_id, func.max(reading.c.timestamp).label("last_seen"))
+        .group_by(reading.c.miner_id)
+        .subquery()
+    )
+    rows = conn.execute(
+        select(reading).join(
+            latest,
+            (reading.c.miner_id == latest.c.miner_id) & (reading.c.timestamp == latest.c.last_seen),
+        )
+    ).mappings().all()
+
+    states = {}
+    for row in rows:
+        states[row["miner_id"]] = MinerState(
+            miner_id=row["miner_id"],
+            last_seen=row["timestamp"],
+            **{field: row[field] for field in (
+                "hash_rate", "temperature", "best_diff", "voltage", "stratumDiff",
+                "sharesAccepted", "sharesRejected", "currentStratumUrl",
+            )},
+        )
+        # Ensure voltage has a default value if it's None
+        if states[row["miner_id"]].voltage is None:
+            states[row["miner_id"]].voltage = 0.0
+
+    with Session(bind=conn) as session:
+        for state in states.values():
+            session.merge(state)
+        session.flush()
+    logger.info(f"Backfilled latest state for {len(states)} miners")
+
+
+def backfill_reading_rollups(conn):
+    """Build rollups of every resolution from existing readings."""
+    with Session(bind=conn) as session:
+        backfill_rollups(session)
+
+
+def enable_incremental_vacuum(conn):
+    """
+    Switch SQLite databases to incremental auto-vacuum so the cleaner can
+    return freed pages to the filesystem. Changing the mode requires a full
+    VACUUM, which runs once here; other backends are left alone.
+    """
+    if conn.dialect.name != "sqlite":
+        return
+    if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() == 2:
+        return
+    conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+    # VACUUM cannot run inside a transaction; nothing has been written on this connection yet
+    conn.exec_driver_sql("VACUUM")
+
+
+def normalize_reading_strings(conn):
+    """
+    Store pool URLs once in stratum_endpoint and best_diff as a number.
+
+    The reported best_diff strings are kept in best_diff_event, one row per
+    change. SQLite copies the readings into a new table so the old rows are
+    freed; other databases alter the table in place.
+    """
+    if "currentStratumUrl" not in _reading_columns(conn):
+        return
+    reading = _legacy_reading()
+
+    conn.execute(insert(StratumEndpoint).from_select(
+        ["url"],
+        select(reading.c.currentStratumUrl).where(reading.c.currentStratumUrl != "").distinct(),
+    ))
+    stratum = StratumEndpoint.__table__
+
+    # Parse each distinct best_diff string once, into a lookup table
+    values = Table(
+        "best_diff_value",
+        MetaData(),
+        Column("text", String(64), primary_key=True),
+        Column("value", Float),
+        prefixes=["TEMPORARY"],
+    )
+    values.create(conn)
+    texts = conn.execute(select(reading.c.best_diff).distinct()).scalars().all()
+    rows = [{"text": text, "value": parse_difficulty(text)} for text in texts if text is not None]
+    for i in range(0, len(rows), VALUE_BATCH_SIZE):
+        conn.execute(insert(values).values(rows[i:i + VALUE_BATCH_SIZE]))
+
+    # Log the first best_diff of each miner and every change after it
+    previous = func.lag(reading.c.best_diff).over(
+        partition_by=reading.c.miner_id, order_by=(reading.c.timestamp, reading.c.id)
+    )
+    history = select(
+        reading.c.miner_id, reading.c.timestamp, reading.c.best_diff, previous.label("previous")
+    ).subquery()
+    conn.execute(insert(BestDiffEvent).from_select(
+        ["miner_id", "timestamp", "best_diff", "value"],
+        select(history.c.miner_id, history.c.timestamp, history.c.best_diff, values.c.value)
+        .join(values, values.c.text == history.c.best_diff)
+        .where(or_(history.c.previous.is_(None), history.c.previous != history.c.best_diff)),
+    ))
+
+    if conn.dialect.name == "sqlite":
+        # Indexes keep their names when a table is renamed
+        for index in Reading.__table__.indexes:
+            conn.exec_driver_sql(f"DROP INDEX IF EXISTS {index.name}")
+        conn.exec_driver_sql("ALTER TABLE reading RENAME TO reading_legacy")
+        Reading.__table__.create(conn)
+
+        legacy = _legacy_reading("reading_legacy")
+        copied = [
+            "id", "miner_id", "timestamp", "hash_rate", "temperature", "voltage",
+            "stratumDiff", "sharesAccepted", "sharesRejected",
+        ]
+        conn.execute(insert(Reading).from_select(
+            copied + ["best_diff", "stratum_id"],
+            select(
+                *(legacy.c[name] for name in copied),
+                func.coalesce(values.c.value, 0.0),
+                stratum.c.id,
+            ).select_from(
+                legacy
+                .outerjoin(values, values.c.text == legacy.c.best_diff)
+                .outerjoin(stratum, stratum.c.url == legacy.c.currentStratumUrl)
+            ),
+        ))
+        conn.exec_driver_sql("DROP TABLE reading_legacy")
+    else:
+        quote = conn.dialect.identifier_preparer.quote
+        float_type = conn.dialect.type_compiler.process(Float())
+        conn.exec_driver_sql("ALTER TABLE reading ADD COLUMN stratum_id INTEGER REFERENCES stratum_endpoint (id)")
+        conn.exec_driver_sql(f"ALTER TABLE reading ADD COLUMN best_diff_value {float_type}")
+
+        target = table("reading", column("best_diff"), column("currentStratumUrl"),
+                       column("stratum_id"), column("best_diff_value"))
+        conn.execute(update(target).values(
+            stratum_id=select(stratum.c.id).where(stratum.c.url == target.c.currentStratumUrl).scalar_subquery(),
+            best_diff_value=select(values.c.value).where(values.c.text == target.c.best_diff).scalar_subquery(),
+        ))
+        conn.exec_driver_sql(f"ALTER TABLE reading DROP COLUMN {quote('currentStratumUrl')}")
+        conn.exec_driver_sql("ALTER TABLE reading DROP COLUMN best_diff")
+        conn.exec_driver_sql("ALTER TABLE reading RENAME COLUMN best_diff_value TO best_diff")
+
+    values.drop(conn)
+    logger.info(f"Normalized readings: {len(rows)} distinct best_diff values")
+
+
+# Ordered list of (version, description, function). Each function receives a
+# connection inside a transaction and must be safe to run against a database
+# freshly created by create_all(). Only ever append to this list.
+MIGRATIONS = [
+    (1, "Add reading (miner_id, timestamp) and timestamp indexes", add_reading_indexes),
+    (2, "Backfill miner_state from existing readings", backfill_miner_state),
+    (3, "Backfill reading rollups from existing readings", backfill_reading_rollups),
+    (4, "Enable SQLite incremental auto-vacuum", enable_incremental_vacuum),
+    (5, "Store pool URLs and best_diff of readings normalized", normalize_reading_strings),
+]
+
+
+def get_schema_version(conn):
+    """Return the highest applied migration version, or 0 for a new database."""
+    return conn.execute(select(func.max(SchemaVersion.version))).scalar() or 0
+
+
+def run_migrations(engine):
+    """
+    Apply all pending migrations in order.
+
+    Each migration runs in its own transaction together with the insert of
+    its schema_version row, so an interrupted upgrade resumes where it stopped.
+
+    Returns:
+        int: The schema version after migrating
+    """
+    with engine.connect() as conn:
+        current = get_schema_version(conn)
+
+    pending = [migration for migration in MIGRATIONS if migration[0] > current]
+    if not pending:
+        logger.info(f"Database schema is up to date (version {current})")
+        return current
+
+    for version, description, migrate in pending:
+        logger.info(f"Applying schema migration {version}: {description}")
+        start = time.perf_counter()
+        with engine.begin() as conn:
+            migrate(conn)
+            conn.execute(insert(SchemaVersion).values(
+                version=version,
+                description=description,
+                applied_at=datetime.datetime.utcnow(),
+            ))
+        logger.info(f"Schema migration {version} applied in {time.perf_counter() - start:.2f}s")
+
+    # Migrations that rewrite tables leave free pages behind
+    try:
+        reclaim_space(engine)
+    except Exception as e:
+        logger.exception(f"Error reclaiming database space after migrating: {e}")
+
+    return pending[-1][0]
@@ -1,28 +1,343 @@
 import datetime
 import logging
+import queue
 import socket
+import threading
+import time
 
 import requests
 
-from .config import DISCORD_WEBHOOK, reload_config
+from .config import get_config
+from .metrics import WEBHOOK_FAILURES, WEBHOOK_RATE_LIMITED, WEBHOOK_SECONDS
 
 logger = logging.getLogger(__name__)
 
+WEBHOOK_TIMEOUT = 10
+
+# Timeout of a test message sent from the web UI, which waits for the result
+TEST_WEBHOOK_TIMEOUT = 5
+
+# Notifications waiting for delivery; alerts beyond this are dropped
+QUEUE_SIZE = 1000
+
+# Delivery attempts per notification and the backoff between failed attempts
+MAX_ATTEMPTS = 5
+RETRY_BACKOFF = 1.0
+MAX_BACKOFF = 60.0
+
+# Discord limits for a single webhook message
+EMBEDS_PER_MESSAGE = 10
+EMBED_DESCRIPTION_LIMIT = 4096
+MESSAGE_EMBED_CHARS = 6000
+
+# Embed title and color per alert type
+ALERT_STYLES = {
+    "temperature": ("🔥 Temperature out of range", 0xE67E22),
+    "voltage": ("⚡ Voltage out of range", 0xF1C40F),
+    "offline": ("🔴 Miners offline", 0xE74C3C),
+    "diff": ("🎉 New best difficulty", 0x9B59B6),
+    "resolved": ("✅ Resolved", 0x2ECC71),
+}
+
+
+class NotificationDispatcher:
+    """
+    Deliver webhook messages from a background thread.
+
+    Alerts are put on a bounded queue and posted by a single worker over a
+    persistent HTTP session, so callers never wait on Discord. Discord's rate
+    limit headers are honoured: a 429 waits for Retry-After, and an exhausted
+    bucket (X-RateLimit-Remaining: 0) pauses until X-RateLimit-Reset-After.
+    Server errors and connection failures are retried with exponential backoff.
+    """
+
+    def __init__(self, maxsize=QUEUE_SIZE):
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._session = requests.Session()
+        self._send_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._thread = None
+        # Webhook URL -> monotonic time before which no request may be sent to it
+        self._blocked_until = {}
+
+    def _block(self, webhook_url, seconds):
+        """Pause requests to a webhook for at least `seconds`."""
+        with self._state_lock:
+            until = time.monotonic() + seconds
+            self._blocked_until[webhook_url] = max(self._blocked_until.get(webhook_url, 0.0), until)
+
+    def _blocked_for(self, webhook_url):
+        """Seconds until a request to the webhook may be sent."""
+        with self._state_lock:
+            return self._blocked_until.get(webhook_url, 0.0) - time.monotonic()
+
+    def _ensure_worker(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="notification-dispatcher", daemon=True)
+                self._thread.start()
+
+    def submit(self, webhook_url, payload, description):
+        """
+        Queue a message for delivery.
+
+        Args:
+            webhook_url: Discord webhook URL
+            payload: JSON body of the webhook request
+            description: Short label used in log messages
+
+        Returns:
+            bool: True if the message was queued, False if the queue is full
+        """
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((webhook_url, payload, description))
+            return True
+        except queue.Full:
+            logger.error(f"Notification queue full ({self._queue.maxsize}), dropping {description}")
+            WEBHOOK_FAILURES.inc()
+            return False
+
+    def send(self, webhook_url, payload, description):
+        """
+        Post a message now, waiting for rate limits and retrying failures.
+
+        Returns:
+            bool: True if the webhook accepted the message
+        """
+        with self._send_lock:
+            for attempt in range(1, MAX_ATTEMPTS + 1):
+                delay = self._blocked_for(webhook_url)
+                if delay > 0:
+                    time.sleep(delay)
+
+                start = time.perf_counter()
+                try:
+                    response = self._session.post(webhook_url, json=payload, timeout=WEBHOOK_TIMEOUT)
+                except requests.RequestException as e:
+                    WEBHOOK_SECONDS.observe(time.perf_counter() - start)
+                    backoff = min(RETRY_BACKOFF * 2 ** (attempt - 1), MAX_BACKOFF)
+                    logger.warning(f"Failed to send {description} (attempt {attempt}/{MAX_ATTEMPTS}): {e}")
+                    self._block(webhook_url, backoff)
+                    continue
+
+                WEBHOOK_SECONDS.observe(time.perf_counter() - start)
+                self._apply_rate_limit(webhook_url, response)
+
+                if response.status_code == 429:
+                    WEBHOOK_RATE_LIMITED.inc()
+                    logger.warning(f"Rate limited while sending {description}, "
+                                   f"retrying in {self._blocked_for(webhook_url):.1f}s")
+                    continue
+                if response.status_code >= 500:
+                    backoff = min(RETRY_BACKOFF * 2 ** (attempt - 1), MAX_BACKOFF)
+                    logger.warning(f"Webhook returned {response.status_code} for {description} "
+                                   f"(attempt {attempt}/{MAX_ATTEMPTS})")
+                    self._block(webhook_url, backoff)
+                    continue
+
+                try:
+                    response.raise_for_status()
+                except requests.HTTPError as e:
+                    # Other client errors will not succeed on retry
+                    logger.error(f"Failed to send {description}: {e}")
+                    WEBHOOK_FAILURES.inc()
+                    return False
+                return True
+
+        logger.error(f"Giving up on {description} after {MAX_ATTEMPTS} attempts")
+        WEBHOOK_FAILURES.inc()
+        return False
+
+    def send_once(self, webhook_url, payload, description, timeout=TEST_WEBHOOK_TIMEOUT):
+        """
+        Post a message with a single attempt, for callers waiting on the result.
+
+        Unlike send(), this neither retries nor waits: a webhook that is
+        currently rate limited fails right away. Rate limit headers of the
+        response still pause the dispatcher's later requests to that webhook.
+
+        Returns:
+            bool: True if the webhook accepted the message
+        """
+        if self._blocked_for(webhook_url) > 0:
+            logger.warning(f"Not sending {description}, the webhook is rate limited")
+            return False
+
+        start = time.perf_counter()
+        try:
+            response = requests.post(webhook_url, json=payload, timeout=timeout)
+        except requests.RequestException as e:
+            logger.error(f"Failed to send {description}: {e}")
+            return False
+        finally:
+            WEBHOOK_SECONDS.observe(time.perf_counter() - start)
+
+        self._apply_rate_limit(webhook_url, response)
+        if response.status_code == 429:
+            WEBHOOK_RATE_LIMITED.inc()
+        try:
+            response.raise_for_status()
+        except requests.HTTPError as e:
+            logger.error(f"Failed to send {description}: {e}")
+            return False
+        return True
+
+    def _apply_rate_limit(self, webhook_url, response):
+        """Pause further requests to a webhook according to Discord's rate limit headers."""
+        wait = None
+        if response.status_code == 429:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after is None:
+                try:
+                    retry_after = response.json().get("retry_after")
+                except ValueError:
+                    retry_after = None
+            wait = float(retry_after) if retry_after is not None else RETRY_BACKOFF
+        elif response.headers.get("X-RateLimit-Remaining") == "0":
+            wait = float(response.headers.get("X-RateLimit-Reset-After", 0))
+
+        if wait:
+            self._block(webhook_url, wait)
+
+    def _run(self):
+        while True:
+            webhook_url, payload, description = self._queue.get()
+            try:
+                if self.send(webhook_url, payload, description):
+                    logger.info(f"Sent {description}")
+            except Exception as e:
+                logger.exception(f"Unexpected error sending {description}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def flush(self, timeout=30):
+        """
+        Wait until all queued messages have been delivered or given up on.
+
+        Returns:
+            bool: True if the queue drained within the timeout
+        """
+        deadline = time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.warning(f"{self._queue.unfinished_tasks} notifications still pending at shutdown")
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+
+dispatcher = NotificationDispatcher()
+
+
+class AlertAggregator:
+    """
+    Collect the alerts of one polling cycle and send them together.
+
+    Alerts are grouped by type into embeds of one line per miner. Embeds are
+    split at Discord's description limit and packed into as few messages as
+    the per-message embed count and character limits allow.
+    """
+
+    def __init__(self):
+        self._alerts = {}
+
+    def add(self, alert_type, line):
+        """Add one alert line under its alert type."""
+        self._alerts.setdefault(alert_type, []).append(line[:EMBED_DESCRIPTION_LIMIT])
+
+    def __len__(self):
+        return sum(len(lines) for lines in self._alerts.values())
+
+    def build_embeds(self):
+        """
+        Returns:
+            list: Embed dicts, each within the description limit
+        """
+        embeds = []
+        for alert_type, lines in self._alerts.items():
+            title, color = ALERT_STYLES[alert_type]
+            chunks = [[]]
+            length = 0
+            for line in lines:
+                if chunks[-1] and length + 1 + len(line) > EMBED_DESCRIPTION_LIMIT:
+                    chunks.append([])
+                    length = 0
+                length += len(line) + (1 if chunks[-1] else 0)
+                chunks[-1].append(line)
+
+            for i, chunk in enumerate(chunks):
+                suffix = f" ({len(lines)})" if i == 0 else " (continued)"
+                embeds.append({"title": title + suffix, "description": "\n".join(chunk), "color": color})
+        return embeds
+
+    def build_messages(self):
+        """
+        Returns:
+            list: Webhook payloads, each within Discord's message limits
+        """
+        messages = []
+        current = []
+        size = 0
+        for embed in self.build_embeds():
+            embed_size = len(embed["title"]) + len(embed["description"])
+            if current and (len(current) == EMBEDS_PER_MESSAGE or size + embed_size > MESSAGE_EMBED_CHARS):
+                messages.append({"embeds": current})
+                current = []
+                size = 0
+            current.append(embed)
+            size += embed_size
+        if current:
+            messages.append({"embeds": current})
+        return messages
+
+    def flush(self):
+        """
+        Queue the collected alerts for delivery and start a new batch.
+
+        Returns:
+            int: Number of webhook messages queued
+        """
+        if not self._alerts:
+            return 0
+
+        webhook_url = get_config().discord_webhook
+
+        count = len(self)
+        messages = self.build_messages()
+        self._alerts = {}
+
+        if not webhook_url:
+            logger.warning(f"Discord webhook URL not configured, skipping {count} alerts")
+            return 0
+
+        queued = 0
+        for i, payload in enumerate(messages, 1):
+            if dispatcher.submit(webhook_url, payload, f"alert batch {i}/{len(messages)}"):
+                queued += 1
+        logger.info(f"Queued {count} alerts in {queued} webhook messages")
+        return queued
+
 def send_startup_notification(service="main"):
     """
     Send a notification when the system starts up to verify webhook configuration.
     
     Args:
         service: The service that's starting ('main' or 'web')
+
+    Returns:
+        bool: True if the notification was queued for delivery
     """
-    # Reload config to ensure we have the latest webhook URL
-    reload_config()
+    webhook_url = get_config().discord_webhook
     
-    if not DISCORD_WEBHOOK:
+    if not webhook_url:
         logger.warning("Discord webhook URL not configured, skipping startup notification")
         return False
         
-    logger.info(f"Sending startup notification to webhook: {DISCORD_WEBHOOK[:20]}...")
+    logger.info(f"Sending startup notification to webhook: {webhook_url[:20]}...")
         
     hostname = socket.gethostname()
     try:
@@ -37,21 +352,17 @@ def send_startup_notification(service="main"):
       f"✅ Discord notifications are working correctly!"
     )
     
-    try:
-        response = requests.post(
-            DISCORD_WEBHOOK, 
-            json={"content": content},
-            timeout=10
-        )
-        response.raise_for_status()
-        logger.info(f"Startup notification for {service_name} sent successfully")
-        return True
-    except Exception as e:
-        logger.error(f"Failed to send startup notification: {e}")
-        return False
+    # Delivered in the background, so startup never waits on Discord
+    return dispatcher.submit(webhook_url, {"content": content}, f"{service_name} startup notification")
 
 
-def send_alert(miner, reading, alert_type="temperature"):
+def reading_summary(reading):
+    """Format the telemetry line shown with every reading alert."""
+    return (f"Temperature: {reading.temperature:.1f}°C | Voltage: {reading.voltage:.2f}V | "
+            f"Hash Rate: {reading.hash_rate:.2f} MH/s")
+
+
+def send_alert(miner, reading, alert_type="temperature", aggregator=None):
     """
     Send temperature or voltage alert via Discord webhook.
     
@@ -59,15 +370,20 @@ def send_alert(miner, reading, alert_type="temperature"):
         miner: The miner instance
         reading: Reading instance with temperature/voltage data
         alert_type: Type of alert ("temperature" or "voltage")
+        aggregator: AlertAggregator collecting the alerts of the current cycle;
+                    the alert is sent on its own if not given
     """
-    # Reload config to ensure we have the latest webhook URL
-    reload_config()
+    if aggregator is not None and alert_type in ("temperature", "voltage"):
+        aggregator.add(alert_type, f"**{miner.name}**: {reading_summary(reading)}")
+        return True
     
-    if not DISCORD_WEBHOOK:
+    webhook_url = get_config().discord_webhook
+    
+    if not webhook_url:
         logger.warning(f"Discord webhook URL not configured, skipping {alert_type} alert for {miner.name}")
         return False
     
-    logger.info(f"Preparing to send {alert_type} alert for {miner.name} via webhook: {DISCORD_WEBHOOK[:20]}...")
+    logger.info(f"Preparing to send {alert_type} alert for {miner.name} via webhook: {webhook_url[:20]}...")
     
     if alert_type == "temperature":
         emoji = "🔥"
@@ -81,79 +397,63 @@ def send_alert(miner, reading, alert_type="temperature"):
         
     content = (
       f"{message}\n"
-      f"Temperature: {reading.temperature:.1f}°C | Voltage: {reading.voltage:.2f}V | Hash Rate: {reading.hash_rate:.2f} MH/s"
+      f"{reading_summary(reading)}"
     )
     
-    try:
-        response = requests.post(
-            DISCORD_WEBHOOK, 
-            json={"content": content},
-            timeout=10
-        )
-        response.raise_for_status()
-        logger.info(f"{alert_type.capitalize()} alert sent for {miner.name}")
-        return True
-    except Exception as e:
-        logger.error(f"Failed to send {alert_type} alert: {e}")
-        return False
+    return dispatcher.submit(webhook_url, {"content": content}, f"{alert_type} alert for {miner.name}")
 
 
-def send_voltage_alert(miner, reading):
+def send_voltage_alert(miner, reading, aggregator=None):
     """
     Send voltage alert via Discord webhook.
     
     Args:
         miner: The miner instance
         reading: Reading instance with voltage data
+        aggregator: Optional AlertAggregator of the current cycle
     """
-    return send_alert(miner, reading, alert_type="voltage")
+    return send_alert(miner, reading, alert_type="voltage", aggregator=aggregator)
 
 
-def send_temperature_alert(miner, reading):
+def send_temperature_alert(miner, reading, aggregator=None):
     """
     Send temperature alert via Discord webhook.
     
     Args:
         miner: The miner instance
         reading: Reading instance with temperature data
+        aggregator: Optional AlertAggregator of the current cycle
     """
-    return send_alert(miner, reading, alert_type="temperature")
+    return send_alert(miner, reading, alert_type="temperature", aggregator=aggregator)
 
 
-def send_diff_alert(miner, reading):
+def send_diff_alert(miner, reading, aggregator=None):
     """
     Send new best difficulty notification via Discord webhook.
     
     Args:
         miner: The miner instance
         reading: Reading instance with best_diff data
+        aggregator: Optional AlertAggregator of the current cycle
     """
-    # Reload config to ensure we have the latest webhook URL
-    reload_config()
+    if aggregator is not None:
+        aggregator.add("diff", f"**{miner.name}**: {reading.best_diff} | {reading_summary(reading)}")
+        return True
+    
+    webhook_url = get_config().discord_webhook
     
-    if not DISCORD_WEBHOOK:
+    if not webhook_url:
         logger.warning(f"Discord webhook URL not configured, skipping diff alert for {miner.name}")
         return False
         
-    logger.info(f"Preparing to send diff alert for {miner.name} via webhook: {DISCORD_WEBHOOK[:20]}...")
+    logger.info(f"Preparing to send diff alert for {miner.name} via webhook: {webhook_url[:20]}...")
         
     content = (
       f"🎉 **{miner.name}** new best diff! {reading.best_diff}\n"
-      f"Temperature: {reading.temperature:.1f}°C | Voltage: {reading.voltage:.2f}V | Hash Rate: {reading.hash_rate:.2f} MH/s"
+      f"{reading_summary(reading)}"
     )
     
-    try:
-        response = requests.post(
-            DISCORD_WEBHOOK, 
-            json={"content": content},
-            timeout=10
-        )
-        response.raise_for_status()
-        logger.info(f"New best diff alert sent for {miner.name}: {reading.best_diff}")
-        return True
-    except Exception as e:
-        logger.error(f"Failed to send best diff alert: {e}")
-        return False
+    return dispatcher.submit(webhook_url, {"content": content}, f"best diff alert for {miner.name}")
 
 def send_test_notification(webhook_url):
     """
@@ -180,72 +480,76 @@ def send_test_notification(webhook_url):
       f"✅ Discord webhook is configured correctly!"
     )
     
-    try:
-        response = requests.post(
-            webhook_url, 
-            json={"content": content},
-            timeout=10
-        )
-        response.raise_for_status()
+    if dispatcher.send_once(webhook_url, {"content": content}, "test notification"):
         logger.info("Test notification sent successfully to webhook")
         return True
-    except Exception as e:
-        logger.error(f"Failed to send test notification: {e}")
-        return False
+    return False
 
-def send_miner_offline_alert(miner):
+def send_miner_offline_alert(miner, last_seen=None, aggregator=None):
     """
     Send an alert when a miner fails to respond to polling.
     
     Args:
         miner: The miner instance that failed to respond
+        last_seen: Timestamp of the miner's latest reading, if known
+        aggregator: Optional AlertAggregator of the current cycle
         
     Returns:
-        bool: True if notification was sent successfully, False otherwise
+        bool: True if the notification was queued, False otherwise
     """
-    # Reload config to ensure we have the latest webhook URL
-    reload_config()
+    last_reading_time = f"{last_seen.strftime('%Y-%m-%d %H:%M:%S')} UTC" if last_seen else "unknown"
     
-    if not DISCORD_WEBHOOK:
+    if aggregator is not None:
+        aggregator.add("offline", f"**{miner.name}** (last seen: {last_reading_time})")
+        return True
+    
+    webhook_url = get_config().discord_webhook
+    
+    if not webhook_url:
         logger.warning(f"Discord webhook URL not configured, skipping offline alert for {miner.name}")
         return False
         
-    logger.info(f"Preparing to send offline alert for {miner.name} via webhook: {DISCORD_WEBHOOK[:20]}...")
-    
-    # Get the last reading time if available
-    last_reading_time = "Unknown"
-    try:
-        from sqlmodel import select
-
-        from .db import Reading, get_session
-        
-        with get_session() as session:
-            last_reading = session.exec(
-                select(Reading)
-                .where(Reading.miner_id == miner.id)
-                .order_by(Reading.timestamp.desc())
-                .limit(1)
-            ).first()
-            
-            if last_reading:
-                last_reading_time = last_reading.timestamp.strftime('%Y-%m-%d %H:%M:%S')
-    except Exception as e:
-        logger.error(f"Failed to get last reading time for offline miner: {e}")
+    logger.info(f"Preparing to send offline alert for {miner.name} via webhook: {webhook_url[:20]}...")
     
     content = (
       f"🔴 **{miner.name}** is **OFFLINE**\n"
-      f"Failed to respond to latest polling event"
+      f"Failed to respond to latest polling event (last seen: {last_reading_time})"
     )
     
-    try:
-        response = requests.post(
-            DISCORD_WEBHOOK, 
-            json={"content": content},
-            timeout=10
-        )
-        response.raise_for_status()
-        logger.info(f"Offline alert sent for {miner.name}")
+    return dispatcher.submit(webhook_url, {"content": content}, f"offline alert for {miner.name}")
+
+
+def send_resolved_alert(miner, condition, value, since, aggregator=None):
+    """
+    Send a notification when an alert condition of a miner has cleared.
+    
+    Args:
+        miner: The miner instance
+        condition: The alert condition ("temperature", "voltage" or "offline")
+        value: Current value of the condition, if it has one
+        since: When the condition started firing
+        aggregator: Optional AlertAggregator of the current cycle
+        
+    Returns:
+        bool: True if the notification was queued, False otherwise
+    """
+    if condition == "temperature":
+        status = f"temperature back in range: {value:.1f}°C"
+    elif condition == "voltage":
+        status = f"voltage back in range: {value:.2f}V"
+    else:
+        status = "is back online"
+    
+    line = f"**{miner.name}** {status} (alerting since {since.strftime('%Y-%m-%d %H:%M:%S')} UTC)"
+    
+    if aggregator is not None:
+        aggregator.add("resolved", line)
         return True
-    except Exception as e:
-        logger.error(f"Failed to send offline alert: {e}")
-        return False 
\ No newline at end of file
+    
+    webhook_url = get_config().discord_webhook
+    
+    if not webhook_url:
+        logger.warning(f"Discord webhook URL not configured, skipping resolved alert for {miner.name}")
+        return False
+    
+    return dispatcher.submit(webhook_url, {"content": f"✅ {line}"}, f"resolved {condition} alert for {miner.name}")
@@ -1,127 +1,345 @@
+import asyncio
+import datetime
 import logging
+import math
+import threading
+import time
+from types import SimpleNamespace
 
-import requests
-from sqlmodel import Session, select
+import httpx
+from sqlmodel import Session
 
-from .config import ENDPOINTS, TEMP_MAX, TEMP_MIN, VOLT_MIN, reload_config
-from .db import Miner, Reading, engine
-from .notifier import (
-    send_diff_alert,
-    send_miner_offline_alert,
-    send_temperature_alert,
-    send_voltage_alert,
-)
+from .alerts import AlertEngine
+from .config import get_config
+from .db import engine
+from .health import endpoint_health
+from .ingest import get_or_create_miners, load_miner_states, store_readings
+from .lease import acquire_leases, new_cycle_id, release_leases, wait_for_leases
+from .metrics import (MINER_POLL_FAILURES, MINER_POLLS_ATTACHED, MINER_POLLS_SKIPPED, MINER_REQUEST_SECONDS,
+                      POLL_CYCLE_SECONDS)
+from .notifier import AlertAggregator
 
 logger = logging.getLogger(__name__)
 
-def poll_once():
+# Seconds to wait for a miner to accept a connection. Miners are on the local
+# network, so a miner that takes longer is most likely powered off.
+CONNECT_TIMEOUT = 2
+
+# Seconds to wait for each read of the response; AxeOS can be slow to answer
+# while it is busy hashing
+READ_TIMEOUT = 8
+
+REQUEST_TIMEOUT = httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT)
+
+# Timeouts of the probe sent to a miner that failed repeatedly, see health.py
+PROBE_TIMEOUT = httpx.Timeout(3, connect=1)
+
+# Lease time on top of the worst-case request time, for storing the results
+# and sending alerts, see lease.py
+LEASE_MARGIN_SECONDS = 60
+
+
+class AsyncPoller:
     """
-    Poll all configured miner endpoints once and store results.
-    Send alerts if thresholds are exceeded.
+    Fetch miner APIs concurrently from a dedicated event loop.
+
+    The loop runs in a background thread so synchronous callers (the scheduler,
+    the web app) can use it, and the HTTP client is kept between polling cycles
+    so connections to the miners are reused. When the concurrency changes, a
+    new client is created and the old one is closed once the calls still
+    using it have finished.
     """
-    logger.info("Starting polling cycle")
 
-    # Force reload config to ensure we have the latest settings
-    reload_config()
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop = None
+        self._client = None
+        self._concurrency = None
+        # Client -> number of _fetch_all() calls using it; only touched from the loop
+        self._client_users = {}
 
-    # Get the latest thresholds after reload
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=self._loop.run_forever, name="poller-loop", daemon=True)
+                thread.start()
+            return self._loop
 
-    # Check if there are any endpoints configured
-    if not ENDPOINTS:
-        logger.warning("No miner endpoints configured, skipping poll")
-        return 0
+    async def _acquire_client(self, concurrency):
+        if self._client is None or self._concurrency != concurrency:
+            old = self._client
+            limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+            self._client = httpx.AsyncClient(timeout=REQUEST_TIMEOUT, limits=limits)
+            self._concurrency = concurrency
+            if old is not None and not self._client_users.get(old):
+                await old.aclose()
+        self._client_users[self._client] = self._client_users.get(self._client, 0) + 1
+        return self._client
 
-    success_count = 0
+    async def _release_client(self, client):
+        self._client_users[client] -= 1
+        if not self._client_users[client]:
+            del self._client_users[client]
+            # Close a client replaced while this call was using it
+            if client is not self._client:
+                await client.aclose()
 
-    with Session(engine) as session:
-        for endpoint_url in ENDPOINTS:
+    async def _fetch(self, client, semaphore, endpoint_url, progress, probe):
+        async with semaphore:
+            logger.info(f"{'Probing' if probe else 'Polling'} miner at {endpoint_url}")
+            start = time.perf_counter()
             try:
-                # Get or create miner record
-                miner = session.exec(select(Miner).where(Miner.endpoint == endpoint_url)).first()
-                if not miner:
-                    logger.info(f"Registering new miner at {endpoint_url}")
-                    miner = Miner(name=f"bitaxe_{endpoint_url.split('://')[-1]}", endpoint=endpoint_url)
-                    session.add(miner)
-                    session.commit()
-                    # Refresh to get the ID
-                    session.refresh(miner)
-
-                # Poll miner API
-                logger.info(f"Polling miner at {endpoint_url}")
-                resp = requests.get(f"{endpoint_url}/api/system/info", timeout=10)
+                if probe:
+                    resp = await client.get(f"{endpoint_url}/api/system/info", timeout=PROBE_TIMEOUT)
+                else:
+                    resp = await client.get(f"{endpoint_url}/api/system/info")
                 resp.raise_for_status()
-                data = resp.json()
+                return resp.json(), None, datetime.datetime.utcnow()
+            except Exception as e:
+                MINER_POLL_FAILURES.inc()
+                return None, e, datetime.datetime.utcnow()
+            finally:
+                MINER_REQUEST_SECONDS.observe(time.perf_counter() - start)
+                if progress is not None:
+                    progress()
 
-                # Log raw voltage data for debugging
-                raw_voltage = data.get("voltage", 0.0)
-                converted_voltage = raw_voltage / 1000.0 if raw_voltage else 0.0
-                logger.info(f"Raw voltage: {raw_voltage}, Converted: {converted_voltage}V, Min threshold: {VOLT_MIN}V")
+    async def _fetch_all(self, endpoints, concurrency, progress, probes):
+        client = await self._acquire_client(concurrency)
+        try:
+            semaphore = asyncio.Semaphore(concurrency)
+            return await asyncio.gather(*(self._fetch(client, semaphore, ep, progress, ep in probes)
+                                          for ep in endpoints))
+        finally:
+            await self._release_client(client)
 
-                stratumUrl = ""
-                if data['isUsingFallbackStratum']:
-                    stratumUrl = f"stratum+tcp://{data['fallbackStratumUser']}@{data['fallbackStratumURL']}:{data['fallbackStratumPort']}"
-                else:
-                    stratumUrl = f"stratum+tcp://{data['stratumUser']}@{data['stratumURL']}:{data['stratumPort']}"
-                # Create reading
-                r = Reading(
-                    miner_id=miner.id,
-                    hash_rate=data["hashRate"],
-                    temperature=data["temp"],
-                    best_diff=data["bestDiff"],
-                    voltage=converted_voltage,  # Convert from millivolts to volts
-                    stratumDiff=data.get("stratumDiff", 0),
-                    sharesAccepted=data.get("sharesAccepted", 0),
-                    sharesRejected=data.get("sharesRejected", 0),
-                    currentStratumUrl = stratumUrl
-                )
-                session.add(r)
-                session.commit()
-                success_count += 1
-
-                # Temperature alerts
-                if r.temperature > TEMP_MAX or r.temperature < TEMP_MIN:
-                    logger.warning(f"Temperature out of range for {miner.name}: {r.temperature}°C (range: {TEMP_MIN}-{TEMP_MAX}°C)")
-                    send_temperature_alert(miner, r)
-
-                # Voltage alerts
-                if r.voltage < VOLT_MIN:
-                    logger.warning(f"Voltage below minimum for {miner.name}: {r.voltage}V (min: {VOLT_MIN}V)")
-                    try:
-                        send_voltage_alert(miner, r)
-                        logger.info(f"Voltage alert sent for {miner.name}")
-                    except Exception as e:
-                        logger.exception(f"Failed to send voltage alert for {miner.name}: {e}")
-                else:
-                    logger.info(f"Voltage OK for {miner.name}: {r.voltage}V (min: {VOLT_MIN}V)")
-
-                # New best diff check
-                prev_reading = session.exec(
-                    select(Reading)
-                    .where(Reading.miner_id == miner.id, Reading.id != r.id)
-                    .order_by(Reading.timestamp.desc())
-                    .limit(1)
-                ).first()
-
-                if prev_reading and r.best_diff != prev_reading.best_diff:
-                    logger.info(f"New best diff for {miner.name}: {r.best_diff}")
-                    send_diff_alert(miner, r)
-
-            except requests.exceptions.RequestException as e:
-                logger.error(f"Failed to poll miner at {endpoint_url}: {e}")
-
-                # Send offline alert when miner fails to respond
-                if miner:
-                    logger.warning(f"Miner {miner.name} appears to be offline, sending alert")
-                    try:
-                        send_miner_offline_alert(miner)
-                    except Exception as alert_error:
-                        logger.exception(f"Failed to send offline alert for {miner.name}: {alert_error}")
+    def fetch_all(self, endpoints, concurrency, progress=None, probes=()):
+        """
+        Fetch /api/system/info from every endpoint, at most `concurrency` at a time.
+
+        Args:
+            endpoints: List of miner base URLs
+            concurrency: Maximum number of requests in flight
+            progress: Called without arguments from the poller thread after each request
+            probes: Endpoints requested with the shorter PROBE_TIMEOUT
+
+        Returns:
+            list: One (data, error, timestamp) tuple per endpoint, in input order.
+                  Exactly one of data and error is set.
+        """
+        loop = self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(self._fetch_all(endpoints, concurrency, progress, set(probes)), loop)
+        return future.result()
+
+
+async_poller = AsyncPoller()
+
+
+def build_reading(miner, data, fetched_at):
+    """
+    Convert a miner's /api/system/info response into the values of a reading.
+
+    Args:
+        miner: The miner instance
+        data: Decoded JSON response
+        fetched_at: Time the response was received
+
+    Returns:
+        dict: Reading values with the pool URL and best_diff as reported;
+              ingest.store_readings() normalizes them for storage
+    """
+    # Log raw voltage data for debugging
+    raw_voltage = data.get("voltage", 0.0)
+    converted_voltage = raw_voltage / 1000.0 if raw_voltage else 0.0
+    logger.debug(f"Raw voltage for {miner.name}: {raw_voltage}, Converted: {converted_voltage}V")
+
+    stratumUrl = ""
+    if data['isUsingFallbackStratum']:
+        stratumUrl = f"stratum+tcp://{data['fallbackStratumUser']}@{data['fallbackStratumURL']}:{data['fallbackStratumPort']}"
+    else:
+        stratumUrl = f"stratum+tcp://{data['stratumUser']}@{data['stratumURL']}:{data['stratumPort']}"
+
+    return {
+        "miner_id": miner.id,
+        "timestamp": fetched_at,
+        "hash_rate": data["hashRate"],
+        "temperature": data["temp"],
+        "best_diff": str(data["bestDiff"]),
+        "voltage": converted_voltage,  # Convert from millivolts to volts
+        "stratumDiff": data.get("stratumDiff", 0),
+        "sharesAccepted": data.get("sharesAccepted", 0),
+        "sharesRejected": data.get("sharesRejected", 0),
+        "currentStratumUrl": stratumUrl,
+    }
+
+
+# Health of a miner after a poll, as returned by poll_endpoints()
+OK = "ok"
+SUSPECT = "suspect"  # Responded, but outside or close to a threshold
+OFFLINE = "offline"
+
+
+def lease_seconds(count, concurrency):
+    """Time after which the leases of a cycle polling `count` miners expire if never released."""
+    rounds = math.ceil(count / max(concurrency, 1))
+    return LEASE_MARGIN_SECONDS + rounds * (REQUEST_TIMEOUT.connect + REQUEST_TIMEOUT.read)
+
+
+def poll_endpoints(endpoints, progress=None):
+    """
+    Poll the given miner endpoints once, store the results and send alerts.
+
+    The sentry and the web app may poll at the same time. Each endpoint is
+    leased to one poll cycle in the database; endpoints another cycle is
+    already polling are not requested again, this cycle waits for and
+    returns that cycle's results instead.
+
+    Args:
+        endpoints: Normalized miner base URLs
+        progress: Called after each miner request, see AsyncPoller.fetch_all()
+
+    Returns:
+        dict: Health of each polled endpoint (OK, SUSPECT or OFFLINE). Miners
+              skipped because their circuit is open are reported OFFLINE.
+    """
+    # The whole cycle uses one consistent snapshot of the settings
+    config = get_config()
+    endpoints = list(endpoints)
+    cycle_id = new_cycle_id()
+    leased, held = acquire_leases(endpoints, cycle_id, lease_seconds(len(endpoints), config.poll_concurrency))
+    if held:
+        logger.info(f"{len(held)} of {len(endpoints)} miners are being polled by another cycle, "
+                    f"waiting for its results")
+
+    statuses = {}
+    try:
+        if leased:
+            statuses = _poll_leased(leased, config, progress)
+    finally:
+        release_leases(cycle_id, leased, statuses)
+
+    if held:
+        attached, unresolved = wait_for_leases(held, progress)
+        MINER_POLLS_ATTACHED.inc(len(attached))
+        statuses.update(attached)
+        if unresolved:
+            statuses.update(poll_endpoints(unresolved, progress))
+    return statuses
+
+
+def _poll_leased(endpoints, config, progress):
+    """Poll endpoints leased to this cycle; see poll_endpoints()."""
+    cycle_start = time.perf_counter()
+    statuses = {}
+
+    # Miners that failed repeatedly are skipped until their next probe, see health.py.
+    # They were reported offline when their circuit opened.
+    requested = []
+    for endpoint_url in endpoints:
+        if endpoint_health.allow(endpoint_url):
+            requested.append(endpoint_url)
+        else:
+            MINER_POLLS_SKIPPED.inc()
+            statuses[endpoint_url] = OFFLINE
+            if progress is not None:
+                progress()
+    probes = [endpoint_url for endpoint_url in requested if endpoint_health.is_probe(endpoint_url)]
+
+    # Query every miner concurrently; results are processed in endpoint order below
+    fetch_start = time.perf_counter()
+    results = async_poller.fetch_all(requested, config.poll_concurrency, progress, probes)
+    logger.info(f"Fetched {len(requested)} miners in {time.perf_counter() - fetch_start:.2f}s "
+                f"(concurrency: {config.poll_concurrency}, skipped: {len(endpoints) - len(requested)}, "
+                f"probes: {len(probes)})")
+
+    readings = []
+    offline_miners = []
+
+    # Miners stay loaded after the commit so alerting needs no refresh queries
+    with Session(engine, expire_on_commit=False) as session:
+        miners = get_or_create_miners(session, requested)
+
+        for endpoint_url, (data, error, fetched_at) in zip(requested, results):
+            miner = miners[endpoint_url]
+            try:
+                # Surface request failures from the fetch stage
+                if error is not None:
+                    raise error
+
+                row = build_reading(miner, data, fetched_at)
+                readings.append((miner, row))
+                endpoint_health.record_success(endpoint_url)
+
+            except httpx.HTTPError as e:
+                logger.error(f"Failed to poll miner at {endpoint_url}: {e!r}")
+                endpoint_health.record_failure(endpoint_url, e)
+                offline_miners.append(miner)
 
             except Exception as e:
+                # Unparseable or incomplete responses (e.g. from a half-booted
+                # miner) count as failed polls for the circuit breaker
                 logger.exception(f"Error processing miner at {endpoint_url}: {e}")
+                endpoint_health.record_failure(endpoint_url, e)
+                statuses[endpoint_url] = SUSPECT
+
+        # Previous best diffs come from the latest-state table, read before this cycle is stored
+        miner_ids = [miner.id for miner in miners.values()]
+        states = load_miner_states(session, miner_ids)
+        prev_best_diffs = {miner_id: state.best_diff for miner_id, state in states.items()}
+        last_seen = {miner_id: state.last_seen for miner_id, state in states.items()}
+
+        # Alert states change in the same transaction as the readings
+        alert_engine = AlertEngine(session, miner_ids=miner_ids)
+        for miner, row in readings:
+            alert_engine.observe_reading(miner, SimpleNamespace(**row), prev_best_diffs.get(miner.id))
+        for miner in offline_miners:
+            alert_engine.observe_offline(miner, last_seen.get(miner.id))
 
-    logger.info(f"Completed polling cycle. Successful: {success_count}/{len(ENDPOINTS)}")
-    return success_count 
+        # Write the whole cycle in a single transaction
+        insert_seconds = store_readings(session, [row for _, row in readings], states)
+
+    for miner, _ in readings:
+        statuses[miner.endpoint] = SUSPECT if miner.id in alert_engine.suspect else OK
+    for miner in offline_miners:
+        statuses[miner.endpoint] = OFFLINE
+
+    # Send alerts once the data is committed so webhooks never hold the write lock.
+    # All alerts of the cycle are collected and sent as a few embed messages.
+    aggregator = AlertAggregator()
+    alert_engine.notify(aggregator)
+    aggregator.flush()
+
+    POLL_CYCLE_SECONDS.observe(time.perf_counter() - cycle_start)
+    logger.info(f"Completed polling cycle. Successful: {len(readings)}/{len(endpoints)}, "
+                f"insert time: {insert_seconds * 1000:.1f} ms")
+    return statuses
+
+
+def poll_once(progress=None, endpoints=None):
+    """
+    Poll all configured miner endpoints once and store results.
+    Send alerts if thresholds are exceeded.
+
+    Args:
+        progress: Called once as progress(total=n) with the number of miners
+                  to poll, then without arguments after each miner request
+        endpoints: Endpoints to poll instead of all configured ones
+
+    Returns:
+        int: Number of miners that were not offline (OK or SUSPECT). This
+             includes miners whose response could not be parsed.
+    """
+    logger.info("Starting polling cycle")
+
+    if endpoints is None:
+        endpoints = get_config().endpoints
+    if progress is not None:
+        progress(total=len(endpoints))
+
+    # Check if there are any endpoints configured
+    if not endpoints:
+        logger.warning("No miner endpoints configured, skipping poll")
+        return 0
 
-    logger.info(f"Completed polling cycle. Successful: {success_count}/{len(ENDPOINTS)}")
-    return success_count 
+    statuses = poll_endpoints(endpoints, progress)
+    return sum(1 for status in statuses.values() if status != OFFLINE)
@@ -0,0 +1,151 @@
+import argparse
+import gc
+import json
+import logging
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from .benchmark import check_baseline, peak_rss_mb, print_results, use_scratch_data_dir
+
+logger = logging.getLogger(__name__)
+
+# Pages and chart data requests measured; {miner_id} is replaced by the first miner
+BENCHMARK_PATHS = (
+    "/",
+    "/history",
+    "/history?miner_id={miner_id}",
+    "/api/history?hours=24",
+    "/api/history?hours=24&miner_id={miner_id}",
+    "/api/history?hours=720",
+)
+
+RESULT_COLUMNS = (
+    ("path", "path", "{}"),
+    ("first_ms", "first (ms)", "{:.1f}"),
+    ("p50_ms", "p50 (ms)", "{:.1f}"),
+    ("p99_ms", "p99 (ms)", "{:.1f}"),
+    ("bytes", "bytes", "{}"),
+    ("peak_rss_mb", "peak rss (MB)", "{:.1f}"),
+    ("peak_rss_growth_mb", "rss growth (MB)", "{:.1f}"),
+)
+
+COMPARED_RESULTS = ("p50_ms", "p99_ms", "bytes")
+
+
+def benchmark_path(client, path, requests):
+    """
+    Request one path repeatedly from the app.
+
+    The first request is reported on its own, as it fills the caches that
+    the following ones may be served from. Peak RSS only ever grows, so the
+    growth shows how much a path raised the peak of the paths measured before.
+
+    Returns:
+        dict: Latency percentiles, response size and memory use
+    """
+    gc.collect()
+    peak_before = peak_rss_mb()
+
+    start = time.perf_counter()
+    response = client.get(path)
+    first = time.perf_counter() - start
+    if response.status_code != 200:
+        raise RuntimeError(f"GET {path} returned HTTP {response.status_code}")
+
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = client.get(path)
+        latencies.append(time.perf_counter() - start)
+
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    peak = peak_rss_mb()
+    return {
+        "path": path,
+        "requests": requests,
+        "first_ms": round(first * 1000, 2),
+        "p50_ms": round(float(p50), 2),
+        "p99_ms": round(float(p99), 2),
+        "bytes": len(response.content),
+        "peak_rss_mb": round(peak, 1),
+        "peak_rss_growth_mb": round(peak - peak_before, 1),
+    }
+
+
+def main(argv=None):
+    """Benchmark the dashboard and history against a large synthetic database."""
+    parser = argparse.ArgumentParser(
+        description="Benchmark Bitaxe Sentry's dashboard and history pages on a synthetic database")
+    parser.add_argument("-n", "--miners", type=int, default=10, help="Miners of a generated database")
+    parser.add_argument("-d", "--days", type=float, default=30, help="Days of history of a generated database")
+    parser.add_argument("-i", "--interval", type=float, default=60, help="Seconds between readings of a generated database")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated values")
+    parser.add_argument("--db", help="SQLite file to use; generated if it has no miners yet and kept afterwards "
+                                     "(default: a temporary file)")
+    parser.add_argument("--requests", type=int, default=30, help="Measured requests per path")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed increase compared with the baseline before the run fails")
+    parser.add_argument("--log-level", default="WARNING", help="Log level during the run")
+    args = parser.parse_args(argv)
+
+    logging.getLogger().setLevel(args.log_level.upper())
+
+    with tempfile.TemporaryDirectory(prefix="bitaxe-benchmark-") as data_dir:
+        use_scratch_data_dir(data_dir, db_path=args.db)
+
+        from fastapi.testclient import TestClient
+        from sqlalchemy import func
+        from sqlmodel import Session, select
+
+        from .db import Miner, Reading, engine, init_db
+        from .webapp import app
+
+        init_db()
+        with Session(engine) as session:
+            has_miners = session.exec(select(func.count()).select_from(Miner)).one() > 0
+        if has_miners:
+            print(f"Using the existing data in {args.db}", file=sys.stderr)
+        else:
+            print(f"Generating {args.miners} miners x {args.days} days every {args.interval}s...",
+                  file=sys.stderr, flush=True)
+            # In a separate process, so generating does not raise the peak RSS measured here
+            subprocess.run([
+                sys.executable, "-m", f"{__package__}.datagen", "--miners", str(args.miners),
+                "--days", str(args.days), "--interval", str(args.interval), "--seed", str(args.seed),
+            ], check=True)
+
+        with Session(engine) as session:
+            miner_id = session.exec(select(func.min(Miner.id))).one()
+            dataset = {
+                "miners": session.exec(select(func.count()).select_from(Miner)).one(),
+                "readings": session.exec(select(func.count()).select_from(Reading)).one(),
+            }
+        print(f"Measuring {dataset['readings']} readings of {dataset['miners']} miners...", file=sys.stderr, flush=True)
+
+        # Requests are made in-process, without a network in between
+        client = TestClient(app)
+        results = [benchmark_path(client, path.format(miner_id=miner_id), args.requests) for path in BENCHMARK_PATHS]
+
+    print_results(results, RESULT_COLUMNS)
+    report = {
+        "options": {"dataset": dataset, "requests": args.requests},
+        # Paths are compared without the miner ID, which differs between databases
+        "results": [dict(result, path=path) for result, path in zip(results, BENCHMARK_PATHS)],
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        return check_baseline(report, args.baseline, args.tolerance, key="path", compared=COMPARED_RESULTS)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
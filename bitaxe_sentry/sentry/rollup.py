@@ -0,0 +1,247 @@
+import datetime
+import logging
+
+from sqlalchemy import and_, delete, insert, or_, tuple_
+from sqlmodel import select
+
+from .db import Miner, Reading, ReadingRollup
+
+logger = logging.getLogger(__name__)
+
+# Bucket widths in seconds: 15 minutes, 1 hour and 1 day. Windows up to
+# history.RAW_HISTORY_HOURS are served from raw readings, and every longer
+# window up to 2 years fits MAX_BUCKETS_PER_SERIES at one of these.
+RESOLUTIONS = (900, 3600, 86400)
+
+# Days each resolution is kept before the cleaner prunes it
+ROLLUP_RETENTION_DAYS = {
+    900: 90,
+    3600: 400,
+    86400: 1830,
+}
+
+# Reading columns aggregated into rollups
+METRICS = ("hash_rate", "temperature", "voltage")
+
+# Upper bound on buckets per miner when choosing a resolution for a time range
+MAX_BUCKETS_PER_SERIES = 1000
+
+# Readings fetched per query while backfilling
+BACKFILL_CHUNK_SIZE = 5000
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def bucket_start(timestamp, resolution):
+    """Return the start of the bucket of the given width that contains timestamp."""
+    seconds = int((timestamp - EPOCH).total_seconds())
+    return EPOCH + datetime.timedelta(seconds=seconds - seconds % resolution)
+
+
+def select_resolution(hours):
+    """
+    Choose the finest rollup resolution that keeps a time range within
+    MAX_BUCKETS_PER_SERIES buckets, falling back to the coarsest one.
+
+    Args:
+        hours: Length of the time range in hours
+
+    Returns:
+        int: Bucket width in seconds
+    """
+    for resolution in RESOLUTIONS:
+        if hours * 3600 / resolution <= MAX_BUCKETS_PER_SERIES:
+            return resolution
+    return RESOLUTIONS[-1]
+
+
+def _new_bucket(values):
+    bucket = {"count": 1}
+    for metric in METRICS:
+        value = values[metric] or 0.0
+        bucket[f"{metric}_min"] = value
+        bucket[f"{metric}_max"] = value
+        bucket[f"{metric}_sum"] = value
+    return bucket
+
+
+def _add_to_bucket(bucket, values):
+    bucket["count"] += 1
+    for metric in METRICS:
+        value = values[metric] or 0.0
+        bucket[f"{metric}_min"] = min(bucket[f"{metric}_min"], value)
+        bucket[f"{metric}_max"] = max(bucket[f"{metric}_max"], value)
+        bucket[f"{metric}_sum"] += value
+
+
+def _bucket_to_row(miner_id, resolution, start, bucket):
+    row = {
+        "miner_id": miner_id,
+        "resolution": resolution,
+        "bucket_start": start,
+        "count": bucket["count"],
+    }
+    for metric in METRICS:
+        row[f"{metric}_min"] = bucket[f"{metric}_min"]
+        row[f"{metric}_max"] = bucket[f"{metric}_max"]
+        row[f"{metric}_avg"] = bucket[f"{metric}_sum"] / bucket["count"]
+    return row
+
+
+def update_rollups(session, rows):
+    """
+    Merge newly stored readings into their rollup buckets.
+
+    Runs in the caller's transaction; nothing is committed here.
+
+    Args:
+        session: Open database session
+        rows: List of dicts with Reading column values
+    """
+    if not rows:
+        return
+
+    for resolution in RESOLUTIONS:
+        # Aggregate the new readings per (miner, bucket)
+        partials = {}
+        for row in rows:
+            key = (row["miner_id"], bucket_start(row["timestamp"], resolution))
+            if key in partials:
+                _add_to_bucket(partials[key], row)
+            else:
+                partials[key] = _new_bucket(row)
+
+        # A cycle usually touches a single bucket, so load by bucket rather than by miner
+        starts = {start for _, start in partials}
+        existing = {
+            (rollup.miner_id, rollup.bucket_start): rollup
+            for rollup in session.exec(
+                select(ReadingRollup).where(
+                    ReadingRollup.resolution == resolution,
+                    ReadingRollup.bucket_start.in_(starts),
+                )
+            ).all()
+        }
+
+        for (miner_id, start), partial in partials.items():
+            rollup = existing.get((miner_id, start))
+            if rollup is None:
+                session.add(ReadingRollup(**_bucket_to_row(miner_id, resolution, start, partial)))
+                continue
+
+            count = rollup.count + partial["count"]
+            for metric in METRICS:
+                setattr(rollup, f"{metric}_min", min(getattr(rollup, f"{metric}_min"), partial[f"{metric}_min"]))
+                setattr(rollup, f"{metric}_max", max(getattr(rollup, f"{metric}_max"), partial[f"{metric}_max"]))
+                total = getattr(rollup, f"{metric}_avg") * rollup.count + partial[f"{metric}_sum"]
+                setattr(rollup, f"{metric}_avg", total / count)
+            rollup.count = count
+
+
+def backfill_rollups(session):
+    """
+    Rebuild all rollups from the stored readings.
+
+    Readings are read per miner in timestamp order with keyset pagination, so
+    memory use does not depend on the size of the reading table. Runs in the
+    caller's transaction; nothing is committed here.
+
+    Returns:
+        int: Number of rollup rows written
+    """
+    session.exec(delete(ReadingRollup))
+
+    written = 0
+    pending = []
+
+    def flush_pending():
+        nonlocal written
+        if pending:
+            # One statement executed for all rows; multi-row VALUES would be compiled anew for every batch
+            session.connection().execute(insert(ReadingRollup), pending)
+        written += len(pending)
+        pending.clear()
+
+    miner_ids = session.exec(select(Miner.id).order_by(Miner.id)).all()
+    for miner_id in miner_ids:
+        # Open bucket per resolution: (start, aggregate)
+        open_buckets = {}
+        last_timestamp = None
+        last_id = None
+
+        while True:
+            query = (
+                select(Reading.id, Reading.timestamp, Reading.hash_rate, Reading.temperature, Reading.voltage)
+                .where(Reading.miner_id == miner_id)
+                .order_by(Reading.timestamp, Reading.id)
+                .limit(BACKFILL_CHUNK_SIZE)
+            )
+            if last_timestamp is not None:
+                query = query.where(or_(
+                    Reading.timestamp > last_timestamp,
+                    and_(Reading.timestamp == last_timestamp, Reading.id > last_id),
+                ))
+            chunk = session.exec(query).all()
+            if not chunk:
+                break
+
+            for reading_id, timestamp, hash_rate, temperature, voltage in chunk:
+                values = {"hash_rate": hash_rate, "temperature": temperature, "voltage": voltage}
+                for resolution in RESOLUTIONS:
+                    start = bucket_start(timestamp, resolution)
+                    current = open_buckets.get(resolution)
+                    if current is not None and current[0] == start:
+                        _add_to_bucket(current[1], values)
+                        continue
+                    if current is not None:
+                        pending.append(_bucket_to_row(miner_id, resolution, *current))
+                    open_buckets[resolution] = (start, _new_bucket(values))
+
+            last_id, last_timestamp = chunk[-1][0], chunk[-1][1]
+            if len(pending) >= BACKFILL_CHUNK_SIZE:
+                flush_pending()
+
+        for resolution, current in open_buckets.items():
+            pending.append(_bucket_to_row(miner_id, resolution, *current))
+
+    flush_pending()
+    logger.info(f"Backfilled {written} rollup rows for {len(miner_ids)} miners")
+    return written
+
+
+def prune_rollups(session, now=None, limit=None):
+    """
+    Delete rollups older than the retention period of their resolution.
+
+    Args:
+        session: Open database session
+        now: Reference time for the retention periods
+        limit: Maximum number of rows deleted per resolution, or None for all
+
+    Returns:
+        int: Number of rollup rows deleted
+    """
+    now = now or datetime.datetime.utcnow()
+    deleted = 0
+    for resolution, days in ROLLUP_RETENTION_DAYS.items():
+        cutoff = now - datetime.timedelta(days=days)
+        expired = and_(ReadingRollup.resolution == resolution, ReadingRollup.bucket_start < cutoff)
+        if limit is None:
+            deleted += session.exec(delete(ReadingRollup).where(expired)).rowcount
+            continue
+
+        keys = session.exec(
+            select(ReadingRollup.miner_id, ReadingRollup.bucket_start)
+            .where(expired)
+            .order_by(ReadingRollup.bucket_start)
+            .limit(limit)
+        ).all()
+        if keys:
+            result = session.exec(
+                delete(ReadingRollup).where(
+                    ReadingRollup.resolution == resolution,
+                    tuple_(ReadingRollup.miner_id, ReadingRollup.bucket_start).in_(keys),
+                )
+            )
+            deleted += result.rowcount
+    return deleted
@@ -0,0 +1,204 @@
+import heapq
+import logging
+import random
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from .config import get_config
+from .health import endpoint_health
+from .poller import OK, poll_endpoints
+
+logger = logging.getLogger(__name__)
+
+# Miners due within this many seconds of each other are polled as one batch,
+# so their readings are written in a single transaction
+BATCH_WINDOW = 1.0
+
+# Batches that may be in flight at the same time; a batch waiting on
+# unresponsive miners does not hold back the ones due after it
+POLL_WORKERS = 4
+
+
+def stagger_phase(endpoint):
+    """
+    Stable position of an endpoint within the poll interval.
+
+    Returns:
+        float: Fraction of the interval in [0, 1), the same in every process
+    """
+    return zlib.crc32(endpoint.encode()) / 2 ** 32
+
+
+def next_slot(endpoint, interval, after):
+    """
+    Next time after `after` at which the endpoint's phase of the interval comes up.
+
+    Slots are aligned to the epoch, so miners keep their place in the interval
+    across restarts and the fleet is spread evenly over it.
+    """
+    offset = stagger_phase(endpoint) * interval
+    return after + interval - ((after - offset) % interval)
+
+
+class MinerScheduler:
+    """
+    Poll every miner on its own schedule.
+
+    Healthy miners are polled once per poll interval at a fixed, hash-based
+    offset with random jitter, which spreads the requests evenly over the
+    interval instead of hitting the whole fleet at once. Miners that are
+    offline or outside or near a threshold are polled every suspect interval
+    until they are healthy again. Miners that come due together are polled as
+    one batch.
+    """
+
+    def __init__(self, poll=poll_endpoints, workers=POLL_WORKERS):
+        """
+        Args:
+            poll: Function polling a list of endpoints, see poller.poll_endpoints()
+            workers: Number of batches polled concurrently
+        """
+        self._poll = poll
+        self._workers = workers
+        self._cond = threading.Condition()
+        self._heap = []  # (due time, endpoint); entries not matching _due are stale
+        self._due = {}  # endpoint -> due time of its live heap entry
+        self._endpoints = set()
+        self._suspect = set()
+        self._in_flight = set()
+        self._config = None
+        self._executor = None
+        self._thread = None
+        self._stop = False
+
+    def _interval(self, endpoint):
+        if endpoint in self._suspect:
+            return min(self._config.suspect_poll_seconds, self._config.poll_interval_seconds)
+        return self._config.poll_interval_seconds
+
+    def _next_due(self, endpoint, now):
+        # A miner with an open circuit is next due when it may be probed
+        retry_at = endpoint_health.retry_at(endpoint)
+        if retry_at is not None:
+            return max(retry_at, now)
+        interval = self._interval(endpoint)
+        jitter = self._config.poll_jitter * interval
+        if endpoint in self._suspect:
+            return now + interval + random.uniform(-jitter, jitter)
+        # Skip the current slot if the last poll ran ahead of it through jitter or batching
+        return next_slot(endpoint, interval, now + jitter + BATCH_WINDOW) + random.uniform(-jitter, jitter)
+
+    def _schedule(self, endpoint, due):
+        self._due[endpoint] = due
+        heapq.heappush(self._heap, (due, endpoint))
+        self._cond.notify()
+
+    def update(self, config):
+        """
+        Apply a configuration snapshot.
+
+        New endpoints are scheduled at their slot, removed ones are dropped and
+        all miners are rescheduled if the intervals changed.
+        """
+        with self._cond:
+            old, self._config = self._config, config
+            reschedule = old is None or (
+                (old.poll_interval_seconds, old.suspect_poll_seconds, old.poll_jitter)
+                != (config.poll_interval_seconds, config.suspect_poll_seconds, config.poll_jitter)
+            )
+            self._endpoints = set(config.endpoints)
+            for endpoint in list(self._due):
+                if endpoint not in self._endpoints:
+                    del self._due[endpoint]
+            self._suspect &= self._endpoints
+            endpoint_health.retain(self._endpoints)
+
+            now = time.time()
+            for endpoint in config.endpoints:
+                if endpoint in self._in_flight:
+                    continue
+                if reschedule or endpoint not in self._due:
+                    self._schedule(endpoint, self._next_due(endpoint, now))
+
+        logger.info(f"Scheduling {len(self._endpoints)} miners every {config.poll_interval_seconds}s "
+                    f"(suspect: {config.suspect_poll_seconds}s, jitter: {config.poll_jitter:.0%})")
+
+    def _take_due(self):
+        """
+        Wait until miners are due and remove them from the queue.
+
+        Returns:
+            list: Endpoints to poll, possibly empty, or None once stopped
+        """
+        with self._cond:
+            while not self._stop:
+                now = time.time()
+                if self._heap and self._heap[0][0] <= now:
+                    break
+                self._cond.wait(self._heap[0][0] - now if self._heap else None)
+            if self._stop:
+                return None
+
+            batch = []
+            horizon = time.time() + BATCH_WINDOW
+            while self._heap and self._heap[0][0] <= horizon:
+                due, endpoint = heapq.heappop(self._heap)
+                if self._due.get(endpoint) != due:
+                    continue
+                del self._due[endpoint]
+                self._in_flight.add(endpoint)
+                batch.append(endpoint)
+            return batch
+
+    def _poll_batch(self, endpoints):
+        statuses = {}
+        try:
+            statuses = self._poll(endpoints)
+        except Exception as e:
+            logger.exception(f"Error polling {len(endpoints)} miners: {e}")
+
+        with self._cond:
+            now = time.time()
+            for endpoint in endpoints:
+                self._in_flight.discard(endpoint)
+                if endpoint not in self._endpoints:
+                    continue
+                was_suspect = endpoint in self._suspect
+                if statuses.get(endpoint) == OK:
+                    self._suspect.discard(endpoint)
+                else:
+                    self._suspect.add(endpoint)
+                if was_suspect != (endpoint in self._suspect):
+                    logger.info(f"Polling {endpoint} every {self._interval(endpoint)}s "
+                                f"({'suspect' if endpoint in self._suspect else 'healthy'})")
+                self._schedule(endpoint, self._next_due(endpoint, now))
+
+    def _run(self):
+        while True:
+            batch = self._take_due()
+            if batch is None:
+                return
+            if batch:
+                self._executor.submit(self._poll_batch, batch)
+
+    def start(self, config=None):
+        """Schedule the configured miners and start polling from a background thread."""
+        self.update(config or get_config())
+        if self._thread is None or not self._thread.is_alive():
+            self._stop = False
+            self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="poll-batch")
+            self._thread = threading.Thread(target=self._run, name="miner-scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop scheduling polls; batches in flight are finished."""
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+
+miner_scheduler = MinerScheduler()
@@ -12,10 +12,17 @@ CONFIG_FILE_PATH = DATA_DIR / "config.json"
 # Default settings
 DEFAULT_SETTINGS = {
     "POLL_INTERVAL_MINUTES": 15,
+    "POLL_INTERVAL_SECONDS": 0,
+    "SUSPECT_POLL_SECONDS": 30,
+    "POLL_JITTER_PERCENT": 10,
+    "POLL_CONCURRENCY": 32,
     "RETENTION_DAYS": 30,
     "TEMP_MIN": 20,
     "TEMP_MAX": 70,
     "VOLT_MIN": 5.0,
+    "TEMP_HYSTERESIS": 2.0,
+    "VOLT_HYSTERESIS": 0.1,
+    "ALERT_COOLDOWN_MINUTES": 60,
     "BITAXE_ENDPOINTS": [],
     "DISCORD_WEBHOOK_URL": ""
 }
@@ -34,10 +41,17 @@ def load_settings():
         logger.info("Running in Kubernetes, skipping loading settings from file")
         config = DEFAULT_SETTINGS.copy()
         config['POLL_INTERVAL_MINUTES'] = int(os.getenv('POLL_INTERVAL_MINUTES', config['POLL_INTERVAL_MINUTES']))
+        config['POLL_INTERVAL_SECONDS'] = int(os.getenv('POLL_INTERVAL_SECONDS', config['POLL_INTERVAL_SECONDS']))
+        config['SUSPECT_POLL_SECONDS'] = int(os.getenv('SUSPECT_POLL_SECONDS', config['SUSPECT_POLL_SECONDS']))
+        config['POLL_JITTER_PERCENT'] = int(os.getenv('POLL_JITTER_PERCENT', config['POLL_JITTER_PERCENT']))
+        config['POLL_CONCURRENCY'] = int(os.getenv('POLL_CONCURRENCY', config['POLL_CONCURRENCY']))
         config['RETENTION_DAYS'] = int(os.getenv('RETENTION_DAYS', config['RETENTION_DAYS']))
         config['TEMP_MIN'] = float(os.getenv('TEMP_MIN', config['TEMP_MIN']))
         config['TEMP_MAX'] = float(os.getenv('TEMP_MAX', config['TEMP_MAX']))
         config['VOLT_MIN'] = float(os.getenv('VOLT_MIN', config['VOLT_MIN']))
+        config['TEMP_HYSTERESIS'] = float(os.getenv('TEMP_HYSTERESIS', config['TEMP_HYSTERESIS']))
+        config['VOLT_HYSTERESIS'] = float(os.getenv('VOLT_HYSTERESIS', config['VOLT_HYSTERESIS']))
+        config['ALERT_COOLDOWN_MINUTES'] = int(os.getenv('ALERT_COOLDOWN_MINUTES', config['ALERT_COOLDOWN_MINUTES']))
         endpoints = os.getenv('BITAXE_ENDPOINTS', '')
         if endpoints:
             config['BITAXE_ENDPOINTS'] = [ep.strip() for ep in endpoints.split(',') if ep.strip()]
@@ -65,10 +79,17 @@ def load_settings():
         # Ensure numeric values are properly converted
         try:
             settings["POLL_INTERVAL_MINUTES"] = int(settings["POLL_INTERVAL_MINUTES"])
+            settings["POLL_INTERVAL_SECONDS"] = int(settings["POLL_INTERVAL_SECONDS"])
+            settings["SUSPECT_POLL_SECONDS"] = int(settings["SUSPECT_POLL_SECONDS"])
+            settings["POLL_JITTER_PERCENT"] = int(settings["POLL_JITTER_PERCENT"])
+            settings["POLL_CONCURRENCY"] = int(settings["POLL_CONCURRENCY"])
             settings["RETENTION_DAYS"] = int(settings["RETENTION_DAYS"])
             settings["TEMP_MIN"] = float(settings["TEMP_MIN"])
             settings["TEMP_MAX"] = float(settings["TEMP_MAX"])
             settings["VOLT_MIN"] = float(settings["VOLT_MIN"])
+            settings["TEMP_HYSTERESIS"] = float(settings["TEMP_HYSTERESIS"])
+            settings["VOLT_HYSTERESIS"] = float(settings["VOLT_HYSTERESIS"])
+            settings["ALERT_COOLDOWN_MINUTES"] = int(settings["ALERT_COOLDOWN_MINUTES"])
             
             # Log the converted values for debugging
             logger.info(f"Loaded settings - POLL_INTERVAL_MINUTES: {settings['POLL_INTERVAL_MINUTES']}, "
@@ -77,10 +98,17 @@ def load_settings():
             logger.error(f"Error converting settings values: {e}, using defaults")
             # Use defaults for any values that couldn't be converted
             settings["POLL_INTERVAL_MINUTES"] = DEFAULT_SETTINGS["POLL_INTERVAL_MINUTES"]
+            settings["POLL_INTERVAL_SECONDS"] = DEFAULT_SETTINGS["POLL_INTERVAL_SECONDS"]
+            settings["SUSPECT_POLL_SECONDS"] = DEFAULT_SETTINGS["SUSPECT_POLL_SECONDS"]
+            settings["POLL_JITTER_PERCENT"] = DEFAULT_SETTINGS["POLL_JITTER_PERCENT"]
+            settings["POLL_CONCURRENCY"] = DEFAULT_SETTINGS["POLL_CONCURRENCY"]
             settings["RETENTION_DAYS"] = DEFAULT_SETTINGS["RETENTION_DAYS"]
             settings["TEMP_MIN"] = DEFAULT_SETTINGS["TEMP_MIN"]
             settings["TEMP_MAX"] = DEFAULT_SETTINGS["TEMP_MAX"]
             settings["VOLT_MIN"] = DEFAULT_SETTINGS["VOLT_MIN"]
+            settings["TEMP_HYSTERESIS"] = DEFAULT_SETTINGS["TEMP_HYSTERESIS"]
+            settings["VOLT_HYSTERESIS"] = DEFAULT_SETTINGS["VOLT_HYSTERESIS"]
+            settings["ALERT_COOLDOWN_MINUTES"] = DEFAULT_SETTINGS["ALERT_COOLDOWN_MINUTES"]
         
         return settings
     except Exception as e:
@@ -102,10 +130,17 @@ def save_settings(settings_dict):
     # Convert types to appropriate values
     try:
         settings_dict["POLL_INTERVAL_MINUTES"] = int(settings_dict.get("POLL_INTERVAL_MINUTES", DEFAULT_SETTINGS["POLL_INTERVAL_MINUTES"]))
+        settings_dict["POLL_INTERVAL_SECONDS"] = int(settings_dict.get("POLL_INTERVAL_SECONDS", DEFAULT_SETTINGS["POLL_INTERVAL_SECONDS"]))
+        settings_dict["SUSPECT_POLL_SECONDS"] = int(settings_dict.get("SUSPECT_POLL_SECONDS", DEFAULT_SETTINGS["SUSPECT_POLL_SECONDS"]))
+        settings_dict["POLL_JITTER_PERCENT"] = int(settings_dict.get("POLL_JITTER_PERCENT", DEFAULT_SETTINGS["POLL_JITTER_PERCENT"]))
+        settings_dict["POLL_CONCURRENCY"] = int(settings_dict.get("POLL_CONCURRENCY", DEFAULT_SETTINGS["POLL_CONCURRENCY"]))
         settings_dict["RETENTION_DAYS"] = int(settings_dict.get("RETENTION_DAYS", DEFAULT_SETTINGS["RETENTION_DAYS"]))
         settings_dict["TEMP_MIN"] = float(settings_dict.get("TEMP_MIN", DEFAULT_SETTINGS["TEMP_MIN"]))
         settings_dict["TEMP_MAX"] = float(settings_dict.get("TEMP_MAX", DEFAULT_SETTINGS["TEMP_MAX"]))
         settings_dict["VOLT_MIN"] = float(settings_dict.get("VOLT_MIN", DEFAULT_SETTINGS["VOLT_MIN"]))
+        settings_dict["TEMP_HYSTERESIS"] = float(settings_dict.get("TEMP_HYSTERESIS", DEFAULT_SETTINGS["TEMP_HYSTERESIS"]))
+        settings_dict["VOLT_HYSTERESIS"] = float(settings_dict.get("VOLT_HYSTERESIS", DEFAULT_SETTINGS["VOLT_HYSTERESIS"]))
+        settings_dict["ALERT_COOLDOWN_MINUTES"] = int(settings_dict.get("ALERT_COOLDOWN_MINUTES", DEFAULT_SETTINGS["ALERT_COOLDOWN_MINUTES"]))
         
         # Log the converted values for debugging
         logger.info(f"Saving settings - POLL_INTERVAL_MINUTES: {settings_dict['POLL_INTERVAL_MINUTES']}, "
@@ -0,0 +1,181 @@
+import bisect
+import dataclasses
+import datetime
+import hashlib
+import logging
+import os
+import socket
+import threading
+
+from sqlalchemy import delete, update
+from sqlmodel import Session, select
+
+from .db import WorkerHeartbeat, engine
+from .ingest import insert_ignoring_duplicates
+from .metrics import SHARD_MINERS, SHARD_WORKERS
+
+logger = logging.getLogger(__name__)
+
+# Split the configured miners among all live sentry workers. The workers
+# must share one database, e.g. PostgreSQL through DB_URL.
+SHARDING_ENABLED = os.getenv("SENTRY_SHARDING", "false").lower() in ("1", "true", "yes")
+
+# Name of this worker; a stable name (such as the pod name) keeps the same
+# miners on a worker across restarts
+WORKER_ID = os.getenv("WORKER_ID") or f"{socket.gethostname()}:{os.getpid()}"
+
+# Seconds between heartbeats, and without a heartbeat before a worker is
+# considered dead and its miners are taken over by the others
+HEARTBEAT_SECONDS = int(os.getenv("WORKER_HEARTBEAT_SECONDS", 10))
+WORKER_TIMEOUT_SECONDS = int(os.getenv("WORKER_TIMEOUT_SECONDS", 30))
+
+# Points per worker on the hash ring; more points split the miners more evenly
+VIRTUAL_NODES = 100
+
+
+def _ring_hash(key):
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Consistent-hash assignment of miner endpoints to workers.
+
+    Every worker is placed at VIRTUAL_NODES points of the ring and an
+    endpoint belongs to the worker at the next point after its own hash.
+    When a worker joins or leaves, only the endpoints of the ring segments it
+    gains or loses move, about 1/N of the fleet.
+    """
+
+    def __init__(self, workers, vnodes=VIRTUAL_NODES):
+        self.workers = tuple(sorted(set(workers)))
+        points = sorted((_ring_hash(f"{worker}#{i}"), worker) for worker in self.workers for i in range(vnodes))
+        self._hashes = [point for point, _ in points]
+        self._owners = [worker for _, worker in points]
+
+    def owner(self, endpoint):
+        """Return the worker an endpoint is assigned to, or None if there are no workers."""
+        if not self._hashes:
+            return None
+        index = bisect.bisect(self._hashes, _ring_hash(endpoint)) % len(self._hashes)
+        return self._owners[index]
+
+    def assign(self, endpoints, worker):
+        """Return the endpoints assigned to `worker`, in their original order."""
+        return tuple(endpoint for endpoint in endpoints if self.owner(endpoint) == worker)
+
+
+class ShardCoordinator:
+    """
+    Keep this worker's heartbeat in the database and track the live workers.
+
+    All workers build the same ring from the worker_heartbeat table, so each
+    polls its own share of the miners without further coordination. While
+    the workers' views differ for up to one heartbeat, poll leases keep two
+    workers from polling the same miner at once (see lease.py).
+    """
+
+    def __init__(self, worker_id=WORKER_ID, heartbeat=HEARTBEAT_SECONDS, timeout=WORKER_TIMEOUT_SECONDS,
+                 db_engine=engine):
+        self.worker_id = worker_id
+        self.heartbeat_seconds = heartbeat
+        self.timeout = timeout
+        self.engine = db_engine
+        self.ring = HashRing([worker_id])
+        self._listeners = []
+        # Serializes heartbeats with the removal of the heartbeat in stop()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add_listener(self, callback):
+        """Call callback(ring) whenever workers join or leave."""
+        self._listeners.append(callback)
+
+    def heartbeat(self):
+        """
+        Record that this worker is alive and reload the live workers.
+
+        Returns:
+            bool: True if the set of live workers changed
+        """
+        with self._lock:
+            # A worker that has left must not register again
+            if self._stop.is_set():
+                return False
+            now = datetime.datetime.utcnow()
+            cutoff = now - datetime.timedelta(seconds=self.timeout)
+            with Session(self.engine) as session:
+                result = session.exec(
+                    update(WorkerHeartbeat).where(WorkerHeartbeat.worker_id == self.worker_id).values(last_seen=now)
+                )
+                if not result.rowcount:
+                    insert_ignoring_duplicates(session, WorkerHeartbeat, [{
+                        "worker_id": self.worker_id,
+                        "hostname": socket.gethostname(),
+                        "started_at": now,
+                        "last_seen": now,
+                    }])
+                session.exec(delete(WorkerHeartbeat).where(WorkerHeartbeat.last_seen <= cutoff))
+                live = set(session.exec(select(WorkerHeartbeat.worker_id)).all())
+                session.commit()
+
+        live.add(self.worker_id)
+        if live == set(self.ring.workers):
+            return False
+
+        joined = live - set(self.ring.workers)
+        left = set(self.ring.workers) - live
+        self.ring = HashRing(live)
+        SHARD_WORKERS.set(len(live))
+        logger.info(f"Sharding miners among {len(live)} workers"
+                    f"{f', joined: {sorted(joined)}' if joined else ''}{f', left: {sorted(left)}' if left else ''}")
+        for callback in list(self._listeners):
+            try:
+                callback(self.ring)
+            except Exception as e:
+                logger.exception(f"Error in shard listener: {e}")
+        return True
+
+    def assign(self, config):
+        """Return a copy of a config snapshot with only the endpoints of this worker."""
+        endpoints = self.ring.assign(config.endpoints, self.worker_id)
+        SHARD_MINERS.set(len(endpoints))
+        return dataclasses.replace(config, endpoints=endpoints)
+
+    def is_leader(self):
+        """Whether this worker runs the fleet-wide maintenance jobs; the first live worker does."""
+        return self.ring.workers[0] == self.worker_id
+
+    def start(self):
+        """Register this worker and keep its heartbeat from a background thread."""
+        self._stop.clear()
+        self.heartbeat()
+        SHARD_WORKERS.set(len(self.ring.workers))
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="shard-heartbeat", daemon=True)
+            self._thread.start()
+            logger.info(f"Worker {self.worker_id} sending heartbeats every {self.heartbeat_seconds}s")
+
+    def stop(self):
+        """Stop the heartbeat and leave, so the other workers take over this worker's miners right away."""
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.heartbeat_seconds)
+        try:
+            # Under the lock, so a heartbeat still in flight cannot insert the row again
+            with self._lock, Session(self.engine) as session:
+                session.exec(delete(WorkerHeartbeat).where(WorkerHeartbeat.worker_id == self.worker_id))
+                session.commit()
+        except Exception as e:
+            logger.warning(f"Could not remove heartbeat of worker {self.worker_id}: {e}")
+
+    def _run(self):
+        while not self._stop.wait(self.heartbeat_seconds):
+            try:
+                self.heartbeat()
+            except Exception as e:
+                logger.exception(f"Error sending worker heartbeat: {e}")
+
+
+coordinator = ShardCoordinator()
@@ -0,0 +1,304 @@
+import argparse
+import asyncio
+import json
+import logging
+import random
+import socket
+import sys
+import threading
+import time
+
+import uvicorn
+
+logger = logging.getLogger(__name__)
+
+# Path of a simulated miner's base URL; the poller appends /api/system/info
+MINER_PATH = "/miners/{index}"
+
+# Suffixes used by AxeOS when reporting difficulties as strings
+DIFFICULTY_UNITS = ((1e12, "T"), (1e9, "G"), (1e6, "M"), (1e3, "k"))
+
+
+def format_difficulty(value):
+    """Format a difficulty the way AxeOS reports bestDiff, e.g. 4.29G."""
+    for scale, suffix in DIFFICULTY_UNITS:
+        if value >= scale:
+            return f"{value / scale:.2f}{suffix}"
+    return str(int(value))
+
+
+class SimulatedMiner:
+    """State of one virtual Bitaxe, changed a little on every request."""
+
+    def __init__(self, index, seed=None):
+        self.index = index
+        self.rng = random.Random(f"{seed}-{index}")
+        self.started = time.time()
+        self.hash_rate = self.rng.uniform(400, 1200)  # GH/s
+        self.temp = self.rng.uniform(45, 62)
+        self.voltage = self.rng.uniform(5000, 5200)  # mV
+        self.best_diff = self.rng.uniform(1e6, 5e9)
+        self.shares_accepted = self.rng.randrange(0, 10000)
+        self.shares_rejected = self.rng.randrange(0, 50)
+        # Older firmware reports bestDiff as a plain number
+        self.numeric_best_diff = self.rng.random() < 0.2
+        self.fallback = self.rng.random() < 0.05
+
+    def system_info(self, variation, best_diff_rate):
+        """
+        Build an /api/system/info response.
+
+        Args:
+            variation: Relative random change of hash rate, temperature and voltage
+            best_diff_rate: Probability that the best difficulty rises
+
+        Returns:
+            dict: Response fields as sent by AxeOS
+        """
+        rng = self.rng
+        hash_rate = self.hash_rate * (1 + rng.uniform(-variation, variation))
+        temp = self.temp * (1 + rng.uniform(-variation, variation))
+        voltage = self.voltage * (1 + rng.uniform(-variation, variation) / 10)
+        self.shares_accepted += rng.randrange(0, 20)
+        if rng.random() < 0.01:
+            self.shares_rejected += 1
+        if rng.random() < best_diff_rate:
+            self.best_diff *= rng.uniform(1.01, 3)
+
+        return {
+            "power": round(hash_rate / 60, 3),
+            "voltage": round(voltage, 1),
+            "current": round(hash_rate * 3.2, 1),
+            "temp": round(temp, 1),
+            "vrTemp": round(temp + 8, 1),
+            "hashRate": round(hash_rate, 2),
+            "bestDiff": int(self.best_diff) if self.numeric_best_diff else format_difficulty(self.best_diff),
+            "bestSessionDiff": format_difficulty(self.best_diff / 4),
+            "stratumDiff": 1000,
+            "isUsingFallbackStratum": int(self.fallback),
+            "freeHeap": rng.randrange(150000, 200000),
+            "coreVoltage": 1200,
+            "coreVoltageActual": rng.randrange(1180, 1210),
+            "frequency": 525,
+            "ssid": "bitaxe-lab",
+            "macAddr": f"02:00:00:{self.index >> 16 & 0xff:02x}:{self.index >> 8 & 0xff:02x}:{self.index & 0xff:02x}",
+            "hostname": f"bitaxe-{self.index}",
+            "wifiStatus": "Connected!",
+            "sharesAccepted": self.shares_accepted,
+            "sharesRejected": self.shares_rejected,
+            "uptimeSeconds": int(time.time() - self.started),
+            "asicCount": 1,
+            "smallCoreCount": 894,
+            "ASICModel": "BM1370",
+            "stratumURL": "public-pool.io",
+            "stratumPort": 21496,
+            "stratumUser": f"bc1qsimulated.bitaxe{self.index}",
+            "fallbackStratumURL": "solo.ckpool.org",
+            "fallbackStratumPort": 3333,
+            "fallbackStratumUser": f"bc1qsimulated.bitaxe{self.index}",
+            "version": "v2.4.2",
+            "boardVersion": "601",
+            "runningPartition": "ota_0",
+            "flipscreen": 1,
+            "overheat_mode": 0,
+            "invertscreen": 0,
+            "invertfanpolarity": 1,
+            "autofanspeed": 1,
+            "fanspeed": rng.randrange(40, 100),
+            "fanrpm": rng.randrange(3000, 6000),
+        }
+
+
+class SimulatedFleet:
+    """
+    ASGI app serving /api/system/info for a fleet of virtual miners.
+
+    Miner n is reachable at MINER_PATH, so one server stands in for thousands
+    of devices. Every request waits for a random latency and then either
+    answers with the miner's current state, fails with HTTP 500 or hangs
+    long enough for the poller to time out.
+    """
+
+    def __init__(self, miners, latency=0.02, latency_jitter=0.01, error_rate=0.0, timeout_rate=0.0,
+                 hang_seconds=30.0, variation=0.02, best_diff_rate=0.01, seed=None):
+        """
+        Args:
+            miners: Number of virtual miners
+            latency: Mean response time in seconds
+            latency_jitter: Maximum random deviation from the mean latency in seconds
+            error_rate: Fraction of requests answered with HTTP 500
+            timeout_rate: Fraction of requests that hang for hang_seconds
+            hang_seconds: How long a hanging request waits before it is answered
+            variation: Relative random change of the reported values per request
+            best_diff_rate: Probability per request that a miner's best difficulty rises
+            seed: Seed of the random values, for repeatable runs
+        """
+        self.miners = [SimulatedMiner(index, seed) for index in range(miners)]
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.hang_seconds = hang_seconds
+        self.variation = variation
+        self.best_diff_rate = best_diff_rate
+        self.rng = random.Random(seed)
+        self.requests = 0
+
+    def endpoints(self, base_url, count=None):
+        """Base URLs of the first `count` miners, as configured in the settings."""
+        return [base_url + MINER_PATH.format(index=index) for index in range(count or len(self.miners))]
+
+    def _miner(self, path):
+        parts = path.strip("/").split("/")
+        if len(parts) != 5 or parts[0] != "miners" or parts[2:] != ["api", "system", "info"]:
+            return None
+        try:
+            index = int(parts[1])
+        except ValueError:
+            return None
+        return self.miners[index] if 0 <= index < len(self.miners) else None
+
+    async def _respond(self, send, status, body, content_type=b"application/json"):
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", content_type), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if scope["type"] != "http":
+            return
+
+        miner = self._miner(scope["path"])
+        if miner is None:
+            await self._respond(send, 404, b'{"error":"not found"}')
+            return
+
+        self.requests += 1
+        roll = self.rng.random()
+        hang = roll < self.timeout_rate
+        failed = not hang and roll < self.timeout_rate + self.error_rate
+        if hang:
+            await asyncio.sleep(self.hang_seconds)
+        else:
+            await asyncio.sleep(max(0.0, self.latency + self.rng.uniform(-self.latency_jitter, self.latency_jitter)))
+
+        if failed:
+            await self._respond(send, 500, b'{"error":"simulated failure"}')
+            return
+        body = json.dumps(miner.system_info(self.variation, self.best_diff_rate)).encode()
+        await self._respond(send, 200, body)
+
+
+class SimulatorServer:
+    """Serve a SimulatedFleet over HTTP from a background thread."""
+
+    def __init__(self, fleet, host="127.0.0.1", port=0):
+        self.fleet = fleet
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def start(self):
+        """
+        Start serving.
+
+        Returns:
+            str: Base URL of the server
+        """
+        # asyncio only sets TCP_NODELAY on sockets created with IPPROTO_TCP;
+        # without it Nagle and delayed ACKs add ~40ms to every response
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        self.port = sock.getsockname()[1]
+
+        config = uvicorn.Config(self.fleet, log_level="warning", access_log=False,
+                                backlog=4096, timeout_keep_alive=60)
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, kwargs={"sockets": [sock]},
+                                        name="miner-simulator", daemon=True)
+        self._thread.start()
+        while not self._server.started:
+            if not self._thread.is_alive():
+                raise RuntimeError("Simulator server failed to start")
+            time.sleep(0.01)
+        logger.info(f"Simulating {len(self.fleet.miners)} miners at {self.base_url}")
+        return self.base_url
+
+    def stop(self):
+        if self._server is not None:
+            self._server.should_exit = True
+            self._thread.join(timeout=5)
+
+
+def add_fleet_arguments(parser):
+    """Add the options of SimulatedFleet to an argument parser."""
+    parser.add_argument("--latency-ms", type=float, default=20, help="Mean response time of a miner")
+    parser.add_argument("--latency-jitter-ms", type=float, default=10, help="Random deviation from the mean response time")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="Fraction of requests that hang")
+    parser.add_argument("--hang-seconds", type=float, default=30, help="How long hanging requests wait")
+    parser.add_argument("--variation", type=float, default=0.02, help="Relative change of reported values per request")
+    parser.add_argument("--best-diff-rate", type=float, default=0.01, help="Probability per request of a new best difficulty")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for repeatable runs")
+
+
+def fleet_from_args(miners, args):
+    return SimulatedFleet(
+        miners,
+        latency=args.latency_ms / 1000,
+        latency_jitter=args.latency_jitter_ms / 1000,
+        error_rate=args.error_rate,
+        timeout_rate=args.timeout_rate,
+        hang_seconds=args.hang_seconds,
+        variation=args.variation,
+        best_diff_rate=args.best_diff_rate,
+        seed=args.seed,
+    )
+
+
+def main(argv=None):
+    """Run a simulated fleet until interrupted."""
+    parser = argparse.ArgumentParser(description="Serve a simulated fleet of Bitaxe miners")
+    parser.add_argument("-n", "--miners", type=int, default=100, help="Number of virtual miners")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=8555, help="Port to listen on; 0 picks a free port")
+    parser.add_argument("--endpoints-file", help="Write the miner base URLs to this file, one per line")
+    add_fleet_arguments(parser)
+    args = parser.parse_args(argv)
+
+    fleet = fleet_from_args(args.miners, args)
+    server = SimulatorServer(fleet, args.host, args.port)
+    base_url = server.start()
+    if args.endpoints_file:
+        with open(args.endpoints_file, "w") as f:
+            f.write("\n".join(fleet.endpoints(base_url)) + "\n")
+    # The first line of output tells scripts where the fleet is served
+    print(base_url, flush=True)
+
+    try:
+        while True:
+            time.sleep(60)
+            logger.info(f"Served {fleet.requests} requests")
+    except KeyboardInterrupt:
+        server.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,7 @@
 from fastapi import FastAPI, Request, Depends, Query, HTTPException, Response, Form
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, RedirectResponse
+from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
 import pathlib
 import logging
 from sqlmodel import Session, select, func, delete
@@ -12,18 +12,40 @@ import subprocess
 from typing import Optional, Dict, Any, List
 import json
 from pydantic import BaseModel
-from .db import get_session, Miner, Reading
-from .config import ENDPOINTS, reload_config
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from .db import get_read_session, get_session, read_engine, AlertState, BestDiffEvent, Miner, MinerState, Reading, ReadingRollup
+from .config import get_config, reload_config, watcher as config_watcher
 from .notifier import send_startup_notification, send_test_notification
 from .version import __version__
 from .settings_manager import load_settings, save_settings
-from .poller import poll_once
+from .jobs import poll_jobs
+from .rollup import select_resolution
+from .downsample import DEFAULT_MAX_POINTS
+from .history import HISTORY_WINDOWS, RAW_HISTORY_HOURS, history_series
+from .live import broadcaster
+from .metrics import register_fleet_collector
+from .export import EXPORT_FORMATS, ExportError, available_formats, export_chunks, export_filename
 
 logger = logging.getLogger(__name__)
 
 # Create FastAPI app
 app = FastAPI(title="Bitaxe Sentry")
 
+@app.on_event("startup")
+def start_config_watcher():
+    """Pick up settings saved by other processes without checking the file per request."""
+    config_watcher.start()
+
+@app.on_event("startup")
+def register_metrics():
+    """Export the fleet gauges from miner_state on every scrape."""
+    register_fleet_collector(read_engine)
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus metrics of this process and the latest state of the fleet."""
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 # Set up templates directory
 templates_path = pathlib.Path(__file__).parent / "templates"
 templates = Jinja2Templates(directory=str(templates_path))
@@ -59,36 +81,29 @@ async def apple_touch_icon():
 
 # Stats for dashboard
 @app.get("/")
-def dashboard(request: Request, success: Optional[str] = None, error: Optional[str] = None, session: Session = Depends(get_session)):
-    # Get the latest reading for each miner
+def dashboard(request: Request, success: Optional[str] = None, error: Optional[str] = None, poll_job: Optional[str] = None, session: Session = Depends(get_read_session)):
+    # Get the latest reading for each miner from the latest-state table
     latest_readings = []
-    miners = session.exec(select(Miner)).all()
+    rows = session.exec(
+        select(Miner, MinerState)
+        .join(MinerState, MinerState.miner_id == Miner.id)
+        .order_by(Miner.id)
+    ).all()
     
     # Track the most recent reading timestamp
     most_recent_timestamp = None
+    now = datetime.datetime.utcnow()
     
-    for miner in miners:
-        latest = session.exec(
-            select(Reading)
-            .where(Reading.miner_id == miner.id)
-            .order_by(Reading.timestamp.desc())
-            .limit(1)
-        ).first()
+    for miner, latest in rows:
+        latest_readings.append({
+            "miner": miner,
+            "reading": latest,
+            "timestamp_ago": (now - latest.last_seen).total_seconds() // 60
+        })
         
-        if latest:
-            # Ensure voltage has a default value if it's None
-            if latest.voltage is None:
-                latest.voltage = 0.0
-                
-            latest_readings.append({
-                "miner": miner,
-                "reading": latest,
-                "timestamp_ago": (datetime.datetime.utcnow() - latest.timestamp).total_seconds() // 60
-            })
-            
-            # Update most recent timestamp if this reading is newer
-            if most_recent_timestamp is None or latest.timestamp > most_recent_timestamp:
-                most_recent_timestamp = latest.timestamp
+        # Update most recent timestamp if this reading is newer
+        if most_recent_timestamp is None or latest.last_seen > most_recent_timestamp:
+            most_recent_timestamp = latest.last_seen
     
     # Use the most recent reading timestamp if available, otherwise use current time
     last_updated = most_recent_timestamp.strftime("%Y-%m-%d %H:%M:%S") if most_recent_timestamp else "Never"
@@ -100,111 +115,119 @@ def dashboard(request: Request, success: Optional[str] = None, error: Optional[s
             "current_time": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             "last_updated": last_updated,
             "success_message": success,
-            "error_message": error
+            "error_message": error,
+            "poll_job": poll_job
         })
     )
 
+@app.get("/api/stream")
+async def stream(request: Request):
+    """Server-sent events with the miner rows that changed since the last event."""
+    return StreamingResponse(
+        broadcaster.stream(request),
+        media_type="text/event-stream",
+        # Keep reverse proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def parse_miner_id(miner_id: Optional[str]) -> Optional[int]:
+    """Parse the optional miner_id query parameter, ignoring invalid values."""
+    if miner_id and miner_id.strip():
+        try:
+            return int(miner_id)
+        except ValueError:
+            logger.warning(f"Invalid miner_id parameter: {miner_id}")
+    return None
+
 @app.get("/history")
 def history(
     request: Request, 
     miner_id: Optional[str] = Query(None),
-    session: Session = Depends(get_session)
+    hours: int = Query(RAW_HISTORY_HOURS),
+    session: Session = Depends(get_read_session)
 ):
     # Get list of miners for dropdown
     miners = session.exec(select(Miner)).all()
+    selected_miner = parse_miner_id(miner_id)
     
-    # Parse miner_id to integer if it's not None or empty
-    selected_miner = None
-    if miner_id and miner_id.strip():
-        try:
-            selected_miner = int(miner_id)
-        except ValueError:
-            logger.warning(f"Invalid miner_id parameter: {miner_id}")
-            selected_miner = None
-    
-    # Get historical data - get 24 hours of data
-    query = select(Reading)
-    if selected_miner:
-        query = query.where(Reading.miner_id == selected_miner)
-    
-    # Limit to last 24 hours of data to keep chart readable
-    cutoff = datetime.datetime.utcnow() - datetime.timedelta(hours=24)
-    query = query.where(Reading.timestamp > cutoff)
-    
-    # Order by timestamp
-    query = query.order_by(Reading.timestamp)
-    readings = session.exec(query).all()
-    
-    # Group readings by miner
-    readings_by_miner = {}
-    for reading in readings:
-        miner = next((m for m in miners if m.id == reading.miner_id), None)
-        if miner:
-            if miner.name not in readings_by_miner:
-                readings_by_miner[miner.name] = []
-            
-            # Ensure voltage has a default value if it's None
-            voltage = reading.voltage
-            if voltage is None:
-                voltage = 0.0
-                
-            readings_by_miner[miner.name].append({
-                "timestamp": reading.timestamp.strftime("%H:%M:%S"),
-                "full_timestamp": reading.timestamp.isoformat(),
-                "hash_rate": reading.hash_rate,
-                "temperature": reading.temperature,
-                "best_diff": reading.best_diff,
-                "voltage": voltage
-            })
-    
-    # Pre-slice the data for different time windows
-    windowed_data = {}
-    windows = [1, 6, 24]
-    
-    # Find the latest timestamp across all miners
-    latest_timestamp = None
-    for miner_name, readings in readings_by_miner.items():
-        if readings:  # Make sure the miner has readings
-            # Sort readings by timestamp to ensure we get the latest one
-            sorted_readings = sorted(readings, key=lambda r: r["full_timestamp"], reverse=True)
-            miner_latest = datetime.datetime.fromisoformat(sorted_readings[0]["full_timestamp"])
-            if latest_timestamp is None or miner_latest > latest_timestamp:
-                latest_timestamp = miner_latest
-    
-    # If we don't have any readings, use current time
-    if latest_timestamp is None:
-        latest_timestamp = datetime.datetime.utcnow()
-    
-    logger.info(f"Using latest timestamp for windowing: {latest_timestamp}")
+    if hours not in HISTORY_WINDOWS:
+        logger.warning(f"Invalid hours parameter: {hours}")
+        hours = RAW_HISTORY_HOURS
     
-    for hours in windows:
-        window_cutoff = latest_timestamp - datetime.timedelta(hours=hours)
-        windowed_data[hours] = {}
-        
-        for miner_name, miner_readings in readings_by_miner.items():
-            windowed_data[hours][miner_name] = [
-                reading for reading in miner_readings
-                if datetime.datetime.fromisoformat(reading["full_timestamp"]) > window_cutoff
-            ]
-            
-            # Log the time range for debugging
-            if windowed_data[hours][miner_name]:
-                first = min(windowed_data[hours][miner_name], key=lambda r: r["full_timestamp"])
-                last = max(windowed_data[hours][miner_name], key=lambda r: r["full_timestamp"])
-                logger.info(f"Window {hours}h for {miner_name}: {first['timestamp']} to {last['timestamp']}")
-            else:
-                logger.info(f"Window {hours}h for {miner_name}: No data points")
+    # The chart data is fetched from /api/history; only check whether there is any
+    if hours > RAW_HISTORY_HOURS:
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(hours=hours)
+        query = select(ReadingRollup.miner_id).where(
+            ReadingRollup.resolution == select_resolution(hours),
+            ReadingRollup.bucket_start > cutoff,
+        )
+        if selected_miner:
+            query = query.where(ReadingRollup.miner_id == selected_miner)
+    else:
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(hours=RAW_HISTORY_HOURS)
+        query = select(Reading.id).where(Reading.timestamp > cutoff)
+        if selected_miner:
+            query = query.where(Reading.miner_id == selected_miner)
+    has_data = session.exec(query.limit(1)).first() is not None
     
     return templates.TemplateResponse(
         "history.html", 
         get_template_context(request, {
             "miners": miners,
             "selected_miner": selected_miner,
-            "readings_by_miner": readings_by_miner,
-            "windowed_data": windowed_data
+            "selected_hours": hours,
+            "has_data": has_data
         })
     )
 
+@app.get("/api/history")
+def api_history(
+    miner_id: Optional[str] = Query(None),
+    hours: int = Query(RAW_HISTORY_HOURS),
+    max_points: int = Query(DEFAULT_MAX_POINTS, ge=3, le=10000),
+    session: Session = Depends(get_read_session)
+):
+    """
+    Chart series for one history window as parallel arrays per miner:
+    epoch seconds in "t" and one array per metric.
+    """
+    if hours not in HISTORY_WINDOWS:
+        raise HTTPException(status_code=400, detail=f"hours must be one of {HISTORY_WINDOWS}")
+    
+    miners = session.exec(select(Miner)).all()
+    selected_miner = parse_miner_id(miner_id)
+    
+    miner_names = {m.id: m.name for m in miners}
+    series = history_series(session, miner_names, hours, max_points, selected_miner)
+    resolution = select_resolution(hours) if hours > RAW_HISTORY_HOURS else None
+    
+    return {"hours": hours, "resolution": resolution, "series": series}
+
+@app.get("/api/export/{fmt}")
+def export_readings(
+    fmt: str,
+    miner_id: Optional[List[int]] = Query(None),
+    start: Optional[datetime.datetime] = Query(None),
+    end: Optional[datetime.datetime] = Query(None),
+):
+    """
+    Download the readings of a miner set and time range as CSV, Parquet or an
+    Arrow IPC stream. The export is streamed and read in batches, so any time
+    range can be exported in constant memory.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=404, detail=f"Export format must be one of {list(EXPORT_FORMATS)}")
+    if fmt not in available_formats():
+        raise HTTPException(status_code=501, detail=f"{fmt} export requires the pyarrow package")
+    try:
+        chunks = export_chunks(fmt, miner_id, start, end)
+    except ExportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    media_type, _ = EXPORT_FORMATS[fmt]
+    headers = {"Content-Disposition": f'attachment; filename="{export_filename(fmt)}"'}
+    return StreamingResponse(chunks, media_type=media_type, headers=headers)
+
 @app.delete("/api/miners/{miner_id}")
 def delete_miner(
     miner_id: int,
@@ -218,8 +241,12 @@ def delete_miner(
     if not miner:
         raise HTTPException(status_code=404, detail="Miner not found")
     
-    # Delete all readings for this miner
+    # Delete all readings, rollups, best diff events, alert states and the latest state for this miner
     session.exec(delete(Reading).where(Reading.miner_id == miner_id))
+    session.exec(delete(ReadingRollup).where(ReadingRollup.miner_id == miner_id))
+    session.exec(delete(BestDiffEvent).where(BestDiffEvent.miner_id == miner_id))
+    session.exec(delete(AlertState).where(AlertState.miner_id == miner_id))
+    session.exec(delete(MinerState).where(MinerState.miner_id == miner_id))
     
     # Delete the miner itself
     session.delete(miner)
@@ -295,13 +322,15 @@ def notify_sentry_service():
 async def save_settings_handler(request: Request):
     """Handle settings form submission"""
     form_data = await request.form()
-    settings_dict = dict(form_data)
+    
+    # Start from the stored settings so values without a form field are kept
+    current_settings = load_settings()
+    settings_dict = {**current_settings, **dict(form_data)}
     
     # Log the settings being saved
-    logger.info(f"Saving settings: {settings_dict}")
+    logger.info(f"Saving settings: {dict(form_data)}")
     
     # Check if endpoints have changed
-    current_settings = load_settings()
     endpoints_changed = False
     
     if isinstance(current_settings["BITAXE_ENDPOINTS"], list):
@@ -335,18 +364,13 @@ async def save_settings_handler(request: Request):
             # Notify the sentry service to reload its configuration
             notify_sentry_service()
             
-            # Only poll immediately if endpoints have changed
-            poll_result = 0
-            if endpoints_changed:
-                poll_result = poll_once()
-                logger.info(f"Immediate poll completed, polled {poll_result} devices")
-            
-            # Provide appropriate feedback
+            # Only poll immediately if endpoints have changed. The poll runs as a
+            # background job; the dashboard receives the readings over /api/stream.
             if endpoints_changed:
-                if poll_result == 0:
+                if not get_config().endpoints:
                     return RedirectResponse(url="/?error=No+miners+configured.+Please+check+your+settings.", status_code=303)
-                else:
-                    return RedirectResponse(url="/?success=Settings+saved+and+miners+polled+successfully.", status_code=303)
+                job = poll_jobs.submit()
+                return RedirectResponse(url=f"/?success=Settings+saved.+Polling+miners+in+the+background.&poll_job={job.id}", status_code=303)
             else:
                 return RedirectResponse(url="/?success=Settings+saved+successfully.", status_code=303)
         except Exception as e:
@@ -371,13 +395,16 @@ def test_webhook(request: WebhookTestRequest):
         logger.exception("Error testing webhook")
         return {"success": False, "error": str(e)}
 
-@app.post("/api/poll-now")
+@app.post("/api/poll-now", status_code=202)
 def poll_now():
-    """Trigger an immediate poll of all devices"""
-    try:
-        # Run the polling function
-        success_count = poll_once()
-        return {"success": True, "polled_count": success_count}
-    except Exception as e:
-        logger.exception("Error triggering poll")
-        return {"success": False, "error": str(e)} 
\ No newline at end of file
+    """Queue an immediate poll of all devices and return its job"""
+    job = poll_jobs.submit()
+    return {"success": True, **job.to_dict(), "status_url": f"/api/poll-jobs/{job.id}"}
+
+@app.get("/api/poll-jobs/{job_id}")
+def poll_job_status(job_id: str):
+    """State and progress of a poll job"""
+    job = poll_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Poll job not found")
+    return job.to_dict() 
\ No newline at end of file
@@ -15,6 +15,10 @@ setup(
     include_package_data=True,
     install_requires=[
         "requests",
+        "httpx",
+        "sniffio",
+        "numpy",
+        "prometheus_client",
         "apscheduler",
         "sqlmodel",
         "fastapi",
@@ -22,10 +26,14 @@ setup(
         "python-dotenv",
         "jinja2",
     ],
+    extras_require={
+        "parquet": ["pyarrow"],
+    },
     python_requires=">=3.7",
     entry_points={
         "console_scripts": [
             "bitaxe-sentry=sentry.__main__:main",
+            "bitaxe-sentry-export=sentry.export:main",
         ],
     },
 ) 
\ No newline at end of file